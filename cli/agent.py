@@ -1,35 +1,123 @@
+import functools
+import hashlib
 import logging
-import json
-from typing import Dict, List, Any
+from typing import IO, Dict, List, Any, Optional
 import os
 import sys
 import platform
 import subprocess
+import threading
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from rich.console import Console
 from rich.panel import Panel
 from rich.prompt import Confirm, Prompt
-from rich.json import JSON
+from rich.highlighter import JSONHighlighter
+from rich.live import Live
+from rich.text import Text
 
-from .api import gemini_client
+from .api import HistoryItem, get_client
+from .config import get_config
 from .executor import executor
-from .ui import display_commands, display_results, console, confirm_execution
-from . import tools
+from .ui import display_commands, display_results, console, confirm_execution, show_panel, PLAIN
+from . import jsonutil, tools
 from .security import security_manager
+from .llm_cache import llm_cache, semantic_cache
 
 logger = logging.getLogger(__name__)
 
+
+@functools.lru_cache(maxsize=None)
+def _os_info() -> Dict[str, str]:
+    """Static OS details for audit reports, computed once per process."""
+    return {"name": os.name, "platform": sys.platform, "release": platform.release()}
+
+
+# XML namespace of Windows event log records.
+_EVENT_NS = "{http://schemas.microsoft.com/win/2004/08/events/event}"
+
+
+def _parse_security_events(stream: IO[str]) -> List[Dict[str, Any]]:
+    """
+    Incrementally parses `wevtutil /f:RenderedXml` output into compact event records.
+
+    wevtutil prints bare <Event> elements without a root, so they are wrapped in one for the parser.
+    Output that is cut off mid-event yields the events that were complete up to that point.
+    """
+    parser = ET.XMLPullParser(events=("end",))
+    parser.feed("<Events>")
+    events: List[Dict[str, Any]] = []
+
+    def drain():
+        for _, elem in parser.read_events():
+            if elem.tag != f"{_EVENT_NS}Event":
+                continue
+            system = elem.find(f"{_EVENT_NS}System")
+            time_created = system.find(f"{_EVENT_NS}TimeCreated") if system is not None else None
+            events.append({
+                "EventID": system.findtext(f"{_EVENT_NS}EventID") if system is not None else None,
+                "Level": system.findtext(f"{_EVENT_NS}Level") if system is not None else None,
+                "TimeCreated": time_created.get("SystemTime") if time_created is not None else None,
+                "Message": (elem.findtext(f"{_EVENT_NS}RenderingInfo/{_EVENT_NS}Message") or "").strip(),
+            })
+            elem.clear()
+
+    try:
+        for chunk in iter(lambda: stream.read(8192), ""):
+            parser.feed(chunk)
+            drain()
+        parser.feed("</Events>")
+        drain()
+    except ET.ParseError as e:
+        logger.warning(f"Stopped parsing wevtutil output: {e}")
+    return events
+
+
+# Built once and reused for every tool result rendered in a session.
+_JSON_HIGHLIGHTER = JSONHighlighter()
+# Highlighting cost grows with the payload; beyond this many characters tool output is shown unstyled.
+_HIGHLIGHT_LIMIT = 4096
+# Tool output larger than this (e.g. a full package list) is cut off before it is rendered.
+_RENDER_LIMIT = 256 * 1024
+
+
+def _render_json(data: Any) -> Text:
+    """Renders data as indented JSON, highlighting it only when it is small enough to be cheap."""
+    raw = jsonutil.dumps(data, indent=True)
+    if len(raw) > _RENDER_LIMIT:
+        raw = raw[:_RENDER_LIMIT] + "\n...[truncated]"
+    text = Text(raw, no_wrap=True)
+    return _JSON_HIGHLIGHTER(text) if len(text) <= _HIGHLIGHT_LIMIT and not PLAIN else text
+
+
 class Agent:
     """An autonomous agent that can execute multi-step plans or engage in interactive sessions."""
 
-    def __init__(self, auto_approve: bool = False):
-        self.history: List[Dict[str, Any]] = []
+    def __init__(self, auto_approve: bool = False, speculative_correction: Optional[bool] = None):
+        """
+        Args:
+            auto_approve: Execute proposed actions without asking the user.
+            speculative_correction: Request a correction in parallel with every action, at the cost of an
+                extra model call per action. It is only used when the action fails without any output,
+                since it was requested before that output existed; other failures are re-prompted with it.
+                Defaults to the CLI_SPECULATIVE_CORRECTION setting.
+        """
+        if speculative_correction is None:
+            speculative_correction = get_config().speculative_correction
+        self.history: List[HistoryItem] = []
+        self.history_cap = 40 # Entries kept verbatim before the oldest ones are summarized
         self.auto_approve = auto_approve
+        self.speculative_correction = speculative_correction
+        self._correction_pool = ThreadPoolExecutor(max_workers=1)
         self.max_retries = 3
+        self.stats = {"cache_hits": 0, "cache_misses": 0}
+        self._embeddings: Dict[str, List[float]] = {}
 
     def start_interactive_session(self):
         """Starts a continuous, interactive session with the user."""
-        console.print(Panel("Welcome to the Interactive Agent Session!", title="[bold green]Agent Mode[/bold green]", subtitle="Type 'quit' or 'exit' to end."))
+        show_panel("Welcome to the Interactive Agent Session!", title="[bold green]Agent Mode[/bold green]", subtitle="Type 'quit' or 'exit' to end.")
         
         while True:
             try:
@@ -42,7 +130,7 @@ class Agent:
                     continue
                 
                 # Add user instruction to history for context
-                self.history.append({"action": "user_instruction", "instruction": user_instruction})
+                self._append_history(HistoryItem(action="user_instruction", instruction=user_instruction))
                 self.execute_step(user_instruction)
 
             except (KeyboardInterrupt, EOFError):
@@ -61,12 +149,9 @@ class Agent:
         success = False
         cmd_response = None
         user_input = "y" # Default to yes for the first attempt
+        seen_failures = OrderedDict() # Failures already sent for correction, oldest first
 
-        # Use the new conversational API call
-        with console.status(f"[yellow]Figuring out next action...[/yellow]"):
-            cmd_response = gemini_client.generate_next_action(
-                history=self.history, user_instruction=instruction
-            )
+        cmd_response = self._next_action(instruction, "[yellow]Figuring out next action...[/yellow]")
 
         while retries < self.max_retries and not success:
             if cmd_response is None: # Should not happen, but for safety
@@ -82,10 +167,10 @@ class Agent:
             
             if not commands and not cmd_response.get("tool"):
                 console.print("[yellow]  -> AI decided no action was necessary.[/yellow]\\n")
-                self.history.append({
-                    "step": step, "action": "none", "explanation": explanation,
-                    "result": {"success": True, "output": "No action taken."}
-                })
+                self._append_history(HistoryItem(
+                    step=step, action="none", explanation=explanation,
+                    result={"success": True, "output": "No action taken."}
+                ))
                 success = True
                 continue
 
@@ -93,7 +178,7 @@ class Agent:
             if "tool" in cmd_response:
                 tool_name = cmd_response["tool"]
                 tool_args = cmd_response.get("tool_args", {})
-                console.print(Panel(f"Tool: [cyan]{tool_name}[/cyan]\\nArgs: [yellow]{tool_args}[/yellow]\\n\\n{explanation}", title="[bold blue]Proposed Tool Call[/bold blue]"))
+                show_panel(f"Tool: [cyan]{tool_name}[/cyan]\\nArgs: [yellow]{tool_args}[/yellow]\\n\\n{explanation}", title="[bold blue]Proposed Tool Call[/bold blue]")
             else:
                 display_commands(commands, explanation)
 
@@ -110,41 +195,73 @@ class Agent:
                 
                 if user_input in ["s", "skip"]:
                     console.print("[yellow]  -> Skipping action.[/yellow]\\n")
-                    self.history.append({
-                        "step": step, "action": "skip", "explanation": "User skipped action.",
-                        "result": {"success": True, "output": "User skipped action."}
-                    })
+                    self._append_history(HistoryItem(
+                        step=step, action="skip", explanation="User skipped action.",
+                        result={"success": True, "output": "User skipped action."}
+                    ))
                     break 
                 
                 if user_input != "y":
-                    with console.status("[yellow]Re-generating action with new instructions...[/yellow]"):
-                        # Use the new conversational API call
-                        cmd_response = gemini_client.generate_next_action(
-                            history=self.history, user_instruction=user_input
-                        )
+                    cmd_response = self._next_action(user_input, "[yellow]Re-generating action with new instructions...[/yellow]")
                     console.clear() 
-                    console.print(Panel(f"Current Task: [bold green]{user_input}[/bold green]", title="[bold cyan]Agent Status[/bold cyan]"))
+                    show_panel(f"Current Task: [bold green]{user_input}[/bold green]", title="[bold cyan]Agent Status[/bold cyan]")
                     continue
 
+            failed_action_str = f"Tool: {cmd_response['tool']}({cmd_response.get('tool_args')})" if 'tool' in cmd_response else " && ".join(commands)
+            correction_override = user_input if user_input not in ["y", "s", "q"] else None
+
+            # Optionally ask for a correction while the action runs, so a failure doesn't wait on a fresh model round-trip.
+            speculative_correction = None
+            if self.speculative_correction and retries + 1 < self.max_retries:
+                speculative_correction = self._correction_pool.submit(
+                    get_client().generate_correction,
+                    history=list(self.history),
+                    failed_action=failed_action_str,
+                    stdout="",
+                    stderr="",
+                    override_instruction=correction_override
+                )
+
             # Execute action
             step_success, output = self._perform_action(cmd_response)
 
             if step_success:
-                success = True
+                success = True # A pending speculative correction is simply discarded
             else:
                 retries += 1
                 console.print(f"[bold yellow]An action failed. Attempting self-correction ({retries}/{self.max_retries}).[/bold yellow]")
-                
-                failed_action_str = f"Tool: {cmd_response['tool']}({cmd_response.get('tool_args')})" if 'tool' in cmd_response else " && ".join(commands)
 
-                if retries < self.max_retries:
+                # A deterministic failure would just get the same correction again, so stop instead of re-asking.
+                failure_key = hashlib.sha256((failed_action_str + output.get("stderr", "")).encode("utf-8")).hexdigest()
+                if failure_key in seen_failures:
+                    console.print("[bold yellow]Correction loop converged on the same failure — aborting.[/bold yellow]")
+                    self._append_history(HistoryItem(
+                        step=step, action="correction_skipped", explanation="The same action failed with the same error again.",
+                        result={"success": False, "output": "Skipped a redundant correction request."}
+                    ))
+                    break
+                seen_failures[failure_key] = None
+                if len(seen_failures) > 8:
+                    seen_failures.popitem(last=False)
+
+                failed_stdout = output.get("stdout", str(output))
+                failed_stderr = output.get("stderr", "")
+                # The speculative request was sent without any output, so it only stands in for a failure that produced none
+                if speculative_correction is not None and (failed_stdout.strip() or failed_stderr.strip()):
+                    speculative_correction.cancel()
+                    speculative_correction = None
+
+                if retries < self.max_retries and speculative_correction is not None:
+                    with console.status("[yellow]Waiting for correction...[/yellow]"):
+                        cmd_response = speculative_correction.result()
+                    console.print("[bold cyan]Correction Attempt:[/bold cyan]")
+                elif retries < self.max_retries:
                     with console.status("[yellow]Generating correction...[/yellow]"):
-                        correction_override = user_input if user_input not in ["y", "s", "q"] else None
-                        cmd_response = gemini_client.generate_correction(
+                        cmd_response = get_client().generate_correction(
                             history=self.history,
                             failed_action=failed_action_str,
-                            stdout=output.get("stdout", str(output)), 
-                            stderr=output.get("stderr", ""),
+                            stdout=failed_stdout,
+                            stderr=failed_stderr,
                             override_instruction=correction_override
                         )
                     console.print("[bold cyan]Correction Attempt:[/bold cyan]")
@@ -153,24 +270,112 @@ class Agent:
             console.print(f"[bold red]Failed to execute step '{step}' after {self.max_retries} retries.[/bold red]")
 
 
+    def _append_history(self, entry: HistoryItem):
+        """Records a history entry, compacting the oldest entries once the cap is exceeded."""
+        self.history.append(entry)
+        if len(self.history) > self.history_cap:
+            self._compact_history()
+
+    def _compact_history(self, count: int = 20):
+        """
+        Replaces the oldest `count` entries with a single summary entry.
+        The very first entry is kept as-is so the start of the prompt stays identical between calls.
+        """
+        old_entries = self.history[1:count + 1]
+        summary = get_client().summarize(old_entries) or f"{len(old_entries)} earlier entries were omitted."
+        self.history = [self.history[0], HistoryItem(action="summary", content=summary)] + self.history[count + 1:]
+
+    def _next_action(self, instruction: str, title: str) -> Dict[str, Any]:
+        """Returns the next action, serving it from the response cache when the same context was seen before."""
+        key = llm_cache.cache_key(get_client().model_name, self.history, instruction)
+        cached = llm_cache.get(key)
+        if cached is None:
+            cached = self._semantic_lookup(instruction)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            logger.info(f"Serving next action from cache (hits={self.stats['cache_hits']}, misses={self.stats['cache_misses']}).")
+            return cached
+
+        self.stats["cache_misses"] += 1
+        response = self._stream_next_action(instruction, title)
+        if self._is_cacheable(response):
+            llm_cache.set(key, response)
+            self._semantic_store(instruction, response)
+        return response
+
+    def _context_for(self, instruction: str) -> List[HistoryItem]:
+        """The history preceding `instruction`, without the entry that records the instruction itself."""
+        if self.history and self.history[-1].instruction == instruction:
+            return self.history[:-1]
+        return self.history
+
+    def _embed(self, instruction: str) -> Optional[List[float]]:
+        """Embeds an instruction once per session; returns None if the embedding call fails."""
+        if instruction not in self._embeddings:
+            try:
+                self._embeddings[instruction] = get_client().embed(instruction)
+            except Exception as e:
+                logger.warning(f"Could not embed instruction for the semantic cache: {e}")
+                return None
+        return self._embeddings[instruction]
+
+    def _semantic_lookup(self, instruction: str) -> Optional[Dict[str, Any]]:
+        """Looks for a cached response to a near-duplicate instruction in the same context."""
+        signature = semantic_cache.signature(self._context_for(instruction))
+        if not semantic_cache.has_entries(signature):
+            return None
+        embedding = self._embed(instruction)
+        return semantic_cache.get(signature, embedding) if embedding else None
+
+    def _semantic_store(self, instruction: str, response: Dict[str, Any]):
+        """Records a response so paraphrases of `instruction` can reuse it."""
+        embedding = self._embed(instruction)
+        if embedding:
+            semantic_cache.set(semantic_cache.signature(self._context_for(instruction)), embedding, response)
+
+    def _is_cacheable(self, response: Dict[str, Any]) -> bool:
+        """Only successful responses whose action passes the security policy are worth replaying."""
+        if "error" in response:
+            return False
+        is_allowed, _ = self._vet_action(response)
+        return is_allowed
+
+    @staticmethod
+    def _vet_action(response: Dict[str, Any]) -> tuple[bool, str]:
+        """Checks a proposed tool call or shell action against the security policy."""
+        if "tool" in response:
+            action_type = 'tool'
+            details = {"tool_name": response["tool"], "tool_args": response.get("tool_args", {})}
+        else:
+            action_type = 'shell'
+            details = {"commands": response.get("commands", [])}
+        return security_manager.is_action_allowed(action_type=action_type, details=details)
+
+    def _stream_next_action(self, instruction: str, title: str) -> Dict[str, Any]:
+        """Streams the model's next action into a live panel so the user sees output as it is generated."""
+        if PLAIN:
+            return get_client().stream_next_action(self.history, instruction, on_chunk=lambda chunk: None)
+
+        streamed = Text()
+        with Live(Panel(streamed, title=title), console=console, transient=True, refresh_per_second=8):
+            return get_client().stream_next_action(self.history, instruction, on_chunk=streamed.append)
+
     def _perform_action(self, response: Dict[str, Any]) -> tuple[bool, Dict[str, Any]]:
         """Performs the action specified by the AI's response after vetting it."""
         commands = response.get("commands", [])
         explanation = response.get("explanation", "")
-        
+
+        # --- Security Check ---
+        is_allowed, reason = self._vet_action(response)
+
         if "tool" in response:
             tool_name = response["tool"]
             tool_args = response.get("tool_args", {})
-            
-            # --- Security Check ---
-            is_allowed, reason = security_manager.is_action_allowed(
-                action_type='tool', 
-                details={"tool_name": tool_name, "tool_args": tool_args}
-            )
+
             if not is_allowed:
                 console.print(f"[bold red]Action Denied:[/bold red] {reason}")
                 history_entry = { "success": False, "output": f"Action denied by security policy: {reason}" }
-                self.history.append({ "action": f"denied_tool:{tool_name}", "args": tool_args, "explanation": explanation, "result": history_entry })
+                self._append_history(HistoryItem(action=f"denied_tool:{tool_name}", args=tool_args, explanation=explanation, result=history_entry))
                 return False, history_entry
             
             if hasattr(tools, tool_name):
@@ -183,7 +388,7 @@ class Agent:
                 # Otherwise, display the raw content/message/error.
                 display_data = {k: v for k, v in tool_result.items() if k != 'success'}
                 if isinstance(tool_result, dict):
-                    output_display = JSON.from_data(display_data)
+                    output_display = _render_json(display_data)
                 else:
                     output_display = (
                         tool_result.get("content") or 
@@ -191,79 +396,71 @@ class Agent:
                         str(tool_result.get("error", "Unknown error"))
                     )
 
-                console.print(Panel(output_display, title=f"[blue]Tool Output: {tool_name}[/blue]", border_style="green" if success else "red"))
+                show_panel(output_display, title=f"[blue]Tool Output: {tool_name}[/blue]", border_style="green" if success else "red")
 
-                self.history.append({
-                    "action": f"tool:{tool_name}", "args": response.get("tool_args", {}), "explanation": explanation, "result": tool_result
-                })
+                self._append_history(HistoryItem(
+                    action=f"tool:{tool_name}", args=response.get("tool_args", {}), explanation=explanation, result=tool_result
+                ))
                 return success, tool_result
             else:
                 console.print(f"[red]Error: Unknown tool '{tool_name}'[/red]")
                 history_entry = { "success": False, "output": f"Tool '{tool_name}' not found." }
-                self.history.append({
-                    "action": f"tool:{tool_name}", "args": response.get("tool_args", {}), "explanation": explanation, "result": history_entry
-                })
+                self._append_history(HistoryItem(
+                    action=f"tool:{tool_name}", args=response.get("tool_args", {}), explanation=explanation, result=history_entry
+                ))
                 return False, history_entry
         else:
-            # --- Security Check for Shell Commands ---
-            is_allowed, reason = security_manager.is_action_allowed(action_type='shell', details={"commands": commands})
             if not is_allowed:
                 console.print(f"[bold red]Action Denied:[/bold red] {reason}")
                 history_entry = { "success": False, "output": f"Action denied by security policy: {reason}" }
-                self.history.append({ "action": "denied_shell", "commands": commands, "explanation": explanation, "result": history_entry })
+                self._append_history(HistoryItem(action="denied_shell", commands=tuple(commands), explanation=explanation, result=history_entry))
                 return False, history_entry
 
-            results = executor.execute_commands(commands)
+            if executor.commands_are_parallel_safe(commands):
+                results = executor.execute_commands_parallel(commands)
+            else:
+                results = executor.execute_commands(commands)
             display_results(results)
 
             success = all(r["success"] for r in results)
             output = results[0] if len(results) == 1 else {"success": success, "stdout": "Multiple commands executed", "stderr": ""}
             
-            self.history.append({
-                "action": "shell", "commands": commands, "explanation": explanation, "result": output
-            })
+            self._append_history(HistoryItem(
+                action="shell", commands=tuple(commands), explanation=explanation, result=output
+            ))
             return success, output 
 
     def run_security_audit(self):
         """Runs a comprehensive security audit."""
-        console.print(Panel("Starting Automated Security Audit", title="[bold red]Security Audit Mode[/bold red]"))
-        
-        audit_data = {}
+        show_panel("Starting Automated Security Audit", title="[bold red]Security Audit Mode[/bold red]")
         
+        # The probes are independent and I/O-bound (subprocesses, /proc and registry reads),
+        # so they run side by side and the collection takes as long as the slowest one.
+        probes = {
+            'policies': tools.check_policies,
+            'packages': tools.list_packages,
+            'cpu_info': tools.get_cpu_info,
+            'memory_info': tools.get_memory_info,
+        }
+        if os.name == 'nt':
+            probes['windows_security_events'] = self._query_windows_security_events
+
         with console.status("[yellow]Gathering system information...[/yellow]"):
-            audit_data['os_info'] = { "name": os.name, "platform": sys.platform, "release": platform.release() }
-            audit_data['policies'] = tools.check_policies()
-            audit_data['packages'] = tools.list_packages()
-            audit_data['cpu_info'] = tools.get_cpu_info()
-            audit_data['memory_info'] = tools.get_memory_info()
+            with ThreadPoolExecutor(max_workers=len(probes)) as pool:
+                futures = {key: pool.submit(probe) for key, probe in probes.items()}
+            audit_data = {"os_info": dict(_os_info())}
+            audit_data.update({key: future.result() for key, future in futures.items()})
 
         console.print("[green]System information collected.[/green]")
 
-        if os.name == 'nt':
-            with console.status("[yellow]Querying Windows Security Event Log...[/yellow]"):
-                # This command queries the 'Security' log for the last 10 critical/error/warning events.
-                # It's a reliable way to get a snapshot of recent security-relevant events.
-                command = "wevtutil qe Security /q:\"*[System[(Level=1 or Level=2 or Level=3)]]\" /c:10 /rd:true /f:text"
-                try:
-                    # We directly use a tool-like function here for simplicity
-                    result = subprocess.run(command, shell=True, capture_output=True, text=True, check=True)
-                    audit_data['windows_security_events'] = result.stdout
-                except subprocess.CalledProcessError as e:
-                    error_message = f"Failed to retrieve Windows security events (run as administrator?).\nError: {e.stderr}"
-                    console.print(f"[bold red]{error_message}[/bold red]")
-                    audit_data['windows_security_events'] = {"error": error_message}
-                except FileNotFoundError:
-                    error_message = "Could not find 'wevtutil'. Is this a non-standard Windows environment?"
-                    console.print(f"[bold red]{error_message}[/bold red]")
-                    audit_data['windows_security_events'] = {"error": error_message}
-        else:
+        if os.name != 'nt':
             # Placeholder for Linux audit
             audit_data['linux_audit_status'] = "Linux audit commands would run here."
 
         console.print("[green]Audit data collection complete.[/green]")
         
         with console.status("[yellow]Generating security report...[/yellow]"):
-            report = gemini_client.generate_audit_report(audit_data)
+            report = get_client().generate_system_audit_report(audit_data)
             
         if "error" in report:
             console.print(f"[red]Error generating report: {report.get('error')}[/red]")
@@ -272,13 +469,54 @@ class Agent:
                 console.print(f"Raw Response:\n{raw_response}")
             return # Stop if report generation fails
 
-        console.print(Panel(report.get("report", "No report generated."), title="[bold green]Security Audit Report[/bold green]"))
+        show_panel(report.get("report", "No report generated."), title="[bold green]Security Audit Report[/bold green]")
         
         report_file = "security_audit_report.md"
         with open(report_file, "w", encoding="utf-8") as f:
             f.write(report.get("report", ""))
         console.print(f"\n[green]Report saved to [bold cyan]{report_file}[/bold cyan][/green]")
 
+    def _query_windows_security_events(self, timeout: int = 30) -> Any:
+        """
+        Queries the 'Security' log for the last 10 critical/error/warning events.
+        Events are parsed as wevtutil writes them. If it does not finish within `timeout` seconds it is
+        killed, and the events that were complete by then are returned.
+        """
+        command = "wevtutil qe Security /q:\"*[System[(Level=1 or Level=2 or Level=3)]]\" /c:10 /rd:true /f:RenderedXml"
+        try:
+            # On Windows a string is passed to CreateProcess as-is, so no shell or console window is needed.
+            proc = subprocess.Popen(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+            )
+        except FileNotFoundError:
+            error_message = "Could not find 'wevtutil'. Is this a non-standard Windows environment?"
+            console.print(f"[bold red]{error_message}[/bold red]")
+            return {"error": error_message}
+
+        # stderr is read on its own thread, so a chatty wevtutil can't fill that pipe and block while stdout is parsed
+        stderr_chunks: List[str] = []
+        stderr_reader = threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()), daemon=True)
+        stderr_reader.start()
+        timer = threading.Timer(timeout, proc.kill)
+        timer.start()
+        try:
+            events = _parse_security_events(proc.stdout)
+            proc.wait()
+            stderr_reader.join()
+        finally:
+            timer.cancel()
+        stderr = "".join(stderr_chunks)
+
+        if proc.returncode == 0 or events:
+            return events
+        error_message = f"Failed to retrieve Windows security events (run as administrator?).\nError: {stderr}"
+        console.print(f"[bold red]{error_message}[/bold red]")
+        return {"error": error_message}
+
     def run_background_tasks(self):
         """The main execution loop for when the agent runs as a service."""
         logger.info("Running background tasks: checking policies.")
@@ -293,9 +531,10 @@ class Agent:
         violations = policy_result.get("violations", [])
         if violations:
             logger.warning(f"Found {len(violations)} policy violations.")
-            # In a more advanced implementation, the agent could be prompted
-            # to generate a remediation plan here.
-            for v in violations:
-                logger.warning(f"  - Policy Violation: {v['policy']} | Details: {v['details']}")
+            # One request covers every violation instead of a round-trip per violation.
+            plans = get_client().generate_batch_remediation(violations)
+            for i, v in enumerate(violations):
+                remediation = plans[i].get("remediation", "N/A") if i < len(plans) else "N/A"
+                logger.warning(f"  - Policy Violation: {v['policy']} | Details: {v['details']} | Remediation: {remediation}")
         else:
             logger.info("Policy check complete. No violations found.") 
\ No newline at end of file
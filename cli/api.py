@@ -1,280 +1,153 @@
-import json
+import asyncio
+import atexit
+import functools
 import logging
+import math
+import random
 import re
 import os
-from typing import Dict, List, Optional, Any
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, Final, List, Optional, Any, Tuple, Union
 
-import google.generativeai as genai
-from google.generativeai.types import GenerationConfig, content_types
+# The SDK builds response schemas with pydantic, which rejects typing.TypedDict before Python 3.12.
+from typing_extensions import TypedDict
 
+
+from . import jsonutil
 from .config import get_config
+from .llm_cache import llm_cache, semantic_cache
 from .tools import TOOL_CONFIG
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 
-class GeminiClient:
-    """A client for interacting with the Google Gemini API."""
-
-    def __init__(self, api_key: str, model: str = "gemini-1.5-pro-latest"):
-        """
-        Initializes the GeminiClient.
-
-        Args:
-            api_key: The Google API key.
-            model: The model to use for generation.
-        """
-        self.api_key = api_key
-        self.model_name = model
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel(self.model_name)
-        self.config = get_config()
-        self.chat = self.model.start_chat(history=[])
-        logger.info(f"Initialized Gemini client with model: {self.model.model_name}")
-
-    def _get_command_generation_prompt(self) -> str:
-        """Constructs the prompt for generating shell commands."""
-        config = self.config
-        base_prompt = config.custom_prompt or """
-        You are a helpful assistant that translates natural language instructions into shell commands.
-        Your task is to:
-        1. Understand the user's intention from their natural language request.
-        2. Generate the appropriate shell command(s) to accomplish that task.
-        3. Provide a brief explanation of what each command does.
-        
-        Respond with a JSON object with the following structure:
-        {
-            "commands": ["command1", "command2", ...],
-            "explanation": "Brief explanation of what these commands do"
-        }
-        
-        Only include the JSON in your response, nothing else.
-        """
-
-        return f"""
-        {base_prompt}
-        """
-
-    def generate_shell_commands(self, instruction: str) -> Dict[str, Any]:
-        """
-        Generates shell commands from a natural language instruction.
-        This is used for the 'run' command.
-        """
-        prompt = self._construct_shell_command_prompt(instruction)
-        try:
-            response = self.model.generate_content(prompt)
-            # Assuming the response is a JSON string
-            return self._parse_json_response(response.text)
-        except Exception as e:
-            logger.error(f"Error generating shell commands: {e}")
-            return {"error": str(e)}
-
-    def generate_plan(self, user_instruction: str) -> Dict[str, Any]:
-        """Generate a step-by-step plan from a high-level instruction."""
-        prompt = f"""
-        You are a master software engineer and systems administrator. Your task is to take a high-level user goal and decompose it into a clear, step-by-step plan. The plan should consist of logical, verifiable steps.
-
-        Respond with a JSON object with the following structure:
-        {{
-            "thought": "A brief thought process on how you're creating the plan.",
-            "plan": [
-                "Step 1: Description of the first logical step.",
-                "Step 2: Description of the second logical step.",
-                "..."
-            ]
-        }}
-
-        User's Goal: {user_instruction}
-        """
-        return self._send_request(prompt)
-
-    def generate_command_for_step(self, goal: str, plan: List[str], history: List[Dict[str, Any]], current_step: str, override_instruction: Optional[str] = None) -> Dict[str, Any]:
-        """Generates a command for a specific step in a plan, considering the history."""
-        history_str = ""
-        if history:
-            history_str = "Here is the history of what has been done so far:\\n"
-            for item in history:
-                history_str += f"- Step: {item['step']}\\n"
-                action = item.get('action', 'unknown')
-                
-                if action == 'shell':
-                    commands = item.get('commands', [])
-                    history_str += f"  - Action: Ran shell command `{' && '.join(commands)}`\\n"
-                elif action.startswith('tool:'):
-                    tool_name = action.split(':')[1]
-                    args = item.get('args', {})
-                    history_str += f"  - Action: Used tool `{tool_name}` with args `{args}`\\n"
-                
-                result = item.get('result', {})
-                outcome = 'Success' if result.get('success') else 'Failure'
-                history_str += f"  - Outcome: {outcome}\\n"
-                
-                output = result.get('output')  # For tools
-                if output is None:  # For shell commands
-                    stdout = result.get('stdout', '')
-                    stderr = result.get('stderr', '')
-                    if stdout or stderr:
-                        output = f"STDOUT: {stdout}\\n  - STDERR: {stderr}"
-                    else:
-                        output = "No output."
-                history_str += f"  - Output: {output}\\n"
-        
-        override_prompt_part = ""
-        if override_instruction:
-            override_prompt_part = f"""
-            The user has provided a new instruction to correct or guide the next action.
-            User's Correction: "{override_instruction}"
-            You MUST prioritize this instruction. Generate an action that follows the user's new guidance for the current step.
-            """
-        
-        prompt = f"""
-        You are an autonomous agent executing a plan to achieve a goal. Your task is to generate the next command to execute OR the next tool to use.
+# Prompt layout rule: every prompt starts with its invariant instructions and ends with the per-call data
+# (goal, plan, history, instruction, failure output). Gemini's implicit prompt cache only matches on an exact
+# prefix, so anything dynamic placed ahead of the static text makes the whole prompt uncacheable. Keep the
+# preambles below free of interpolated values and append dynamic parts after them.
+#
+# Explicit caching (genai.caching.CachedContent) is not used: the models require a minimum of several
+# thousand tokens per cached entry, far more than these preambles, so creating one would fail.
 
-        You have access to the following tools:
-        - `read_file(file_path: str)`: Reads the entire content of a file.
-        - `write_file(file_path: str, content: str)`: Writes content to a file, creating it if it doesn't exist.
-        - `list_directory(path: str)`: Lists the contents of a directory with details.
-        - `get_cpu_info()`: Gets detailed CPU usage and stats.
-        - `get_memory_info()`: Gets detailed RAM and swap usage.
-        - `get_disk_usage(path: str)`: Gets disk usage for a specific path.
-        - `list_processes()`: Lists running processes with their details.
-
-        **Important:** When asked for system information (CPU, memory, disk, processes, files), ALWAYS prefer the available tools over running shell commands like `ps`, `df`, `ls`, `dir`, etc. The tool output is structured and more reliable.
-
-        **Observability & Remediation:**
-        You can monitor files for changes using the `monitor_file` tool. This is useful for watching log files. If you find an error, you can then use another tool or command to try and fix it.
+# Kept constant and sent ahead of every agent prompt as the system instruction, so it forms a cacheable prefix.
+AGENT_SYSTEM_PROMPT: Final[str] = """
+You are Owl, a helpful and friendly AI assistant operating on a Linux system.
+Your goal is to have a conversation with the user and help them with their tasks.
 
-        **Policy Enforcement:**
-        You can check the system for compliance with user-defined policies using the `check_policies` tool. If you find violations, you should report them and suggest a remediation action.
+Based on the conversation, provide a helpful response to the user's latest instruction.
+For now, just respond with a simple JSON object like this:
+{
+    "response": "Your friendly response here."
+}
+"""
 
-        **Deep System Awareness:**
-        For diagnosing system issues, your primary tool should be `read_windows_event_log`. This provides direct, structured access to the OS's core event logs and is more reliable than reading plain text log files.
 
-        Overall Goal: {goal}
+STEP_PROMPT_PREAMBLE: Final[str] = """
+You are an autonomous agent executing a plan to achieve a goal. Your task is to generate the next command to execute OR the next tool to use.
 
-        Full Plan:
-        {chr(10).join(f'{i+1}. {s}' for i, s in enumerate(plan))}
+You have access to the following tools:
+- `read_file(file_path: str)`: Reads the entire content of a file.
+- `write_file(file_path: str, content: str)`: Writes content to a file, creating it if it doesn't exist.
+- `list_directory(path: str)`: Lists the contents of a directory with details.
+- `get_cpu_info()`: Gets detailed CPU usage and stats.
+- `get_memory_info()`: Gets detailed RAM and swap usage.
+- `get_disk_usage(path: str)`: Gets disk usage for a specific path.
+- `list_processes()`: Lists running processes with their details.
 
-        {history_str}
+**Important:** When asked for system information (CPU, memory, disk, processes, files), ALWAYS prefer the available tools over running shell commands like `ps`, `df`, `ls`, `dir`, etc. The tool output is structured and more reliable.
 
-        {override_prompt_part}
+**Observability & Remediation:**
+You can monitor files for changes using the `monitor_file` tool. This is useful for watching log files. If you find an error, you can then use another tool or command to try and fix it.
 
-        Now, generate the action for this step: "{current_step}"
+**Policy Enforcement:**
+You can check the system for compliance with user-defined policies using the `check_policies` tool. If you find violations, you should report them and suggest a remediation action.
 
-        Consider the goal, the plan, and the execution history.
-        If you need to use a tool, respond in this JSON format:
-        {{
-            "tool": "tool_name",
-            "tool_args": {{"arg1": "value1", ...}},
-            "explanation": "Why you are using this tool."
-        }}
+**Deep System Awareness:**
+For diagnosing system issues, your primary tool should be `read_windows_event_log`. This provides direct, structured access to the OS's core event logs and is more reliable than reading plain text log files.
 
-        If you need to run a shell command, respond in this JSON format:
-        {{
-            "commands": ["command1", "command2", ...],
-            "explanation": "Brief explanation of what these commands do."
-        }}
-        
-        If you think no action is needed (e.g., a manual verification step), return an empty commands list or tool name.
-        If the previous steps failed, you might need to generate an action to fix the issue.
-        Only include one of "tool" or "commands" in your response.
-        Only include the JSON in your response, nothing else.
-        """
-        return self._send_request(prompt)
+Consider the goal, the plan, and the execution history given below.
+If you need to use a tool, respond in this JSON format:
+{
+    "tool": "tool_name",
+    "tool_args": {"arg1": "value1", ...},
+    "explanation": "Why you are using this tool."
+}
 
-    def generate_correction(self, history: List[Dict[str, Any]], failed_action: str, stdout: str, stderr: str, override_instruction: Optional[str] = None) -> Dict[str, Any]:
-        """Generates a new action to correct a failed action in a conversational context."""
-        # Use the same history formatting as generate_next_action
-        history_str = "This is the conversation history so far:\\n"
-        for item in history:
-            actor = "User" if item.get('action') == 'user_instruction' else "Agent"
-            content = ""
-            if actor == "User":
-                content = item.get('instruction', '')
-            else: # Agent action
-                action_type = item.get('action', 'unknown')
-                if action_type == 'shell':
-                    content = f"Ran command: `{' && '.join(item.get('commands', []))}`"
-                elif action_type.startswith('tool:'):
-                    content = f"Used tool: `{action_type.split(':')[1]}` with args `{item.get('args')}`"
-                
-                result = item.get('result', {})
-                if result.get('success', False):
-                    content += f" -> Success. Output: {result.get('output', 'None')}"
-                else:
-                    content += f" -> Failed. Output: {result.get('output', 'None')}"
-
-            history_str += f"{actor}: {content}\\n"
+If you need to run a shell command, respond in this JSON format:
+{
+    "commands": ["command1", "command2", ...],
+    "explanation": "Brief explanation of what these commands do."
+}
 
-        override_prompt_part = ""
-        if override_instruction:
-            override_prompt_part = f"""
-            The user has provided a new instruction to guide the correction.
-            User's Correction: "{override_instruction}"
-            You MUST prioritize this instruction.
-            """
+If you think no action is needed (e.g., a manual verification step), return an empty commands list or tool name.
+If the previous steps failed, you might need to generate an action to fix the issue.
+Only include one of "tool" or "commands" in your response.
+Only include the JSON in your response, nothing else.
+"""
 
-        prompt = f"""
-        You are a conversational AI assistant. Your last action failed. Your task is to analyze the error and generate a new action to fix the issue.
+CORRECTION_PROMPT_PREAMBLE: Final[str] = """
+You are a conversational AI assistant. Your last action failed. Your task is to analyze the error and generate a new action to fix the issue.
+
+**Correction Strategy:**
+1.  Analyze the error message from the failed action.
+2.  If the cause is unclear, **use `web_search` to find information about the error message.**
+3.  Based on your analysis or the search results, propose a new action to fix the problem.
+
+If you need to use a tool, respond in this JSON format:
+{
+    "tool": "tool_name",
+    "tool_args": {"arg1": "value1", ...},
+    "explanation": "Why you are using this tool to correct the error."
+}
+
+If you need to run a shell command, respond in this JSON format:
+{
+    "commands": ["new_command_to_try"],
+    "explanation": "A brief explanation of why the previous command failed and why this new command should work."
+}
+
+If you believe the error is unrecoverable, respond with an empty "commands" or "tool" field and an explanation.
+Only include the JSON in your response, nothing else.
+"""
 
-        **Correction Strategy:**
-        1.  Analyze the error message from the failed action.
-        2.  If the cause is unclear, **use `web_search` to find information about the error message.**
-        3.  Based on your analysis or the search results, propose a new action to fix the problem.
 
-        Here is the conversation history leading to the failure:
-        {history_str}
+# The per-call parts of the step and correction prompts, filled in with str.format after the constant preambles.
+_STEP_PROMPT_SUFFIX: Final[str] = """
+Overall Goal: {goal}
 
-        The action that FAILED was:
-        `{failed_action}`
+Full Plan:
+{plan}
 
-        Its output was:
-        ---
-        STDOUT:
-        {stdout}
-        ---
-        STDERR:
-        {stderr}
-        ---
+{history}
 
-        {override_prompt_part}
+{override}
 
-        Analyze the error and the user's instructions. Generate a new action to recover from this error and continue the conversation.
+Now, generate the action for this step: "{current_step}"
+"""
 
-        If you need to use a tool, respond in this JSON format:
-        {{
-            "tool": "tool_name",
-            "tool_args": {{"arg1": "value1", ...}},
-            "explanation": "Why you are using this tool to correct the error."
-        }}
+# Templates for the single-shot prompts, filled in with str.format. Each starts with its fixed instructions and
+# takes the per-call values as named fields.
+_PLAN_PROMPT: Final[str] = """
+        You are a master software engineer and systems administrator. Your task is to take a high-level user goal and decompose it into a clear, step-by-step plan. The plan should consist of logical, verifiable steps.
 
-        If you need to run a shell command, respond in this JSON format:
+        Respond with a JSON object with the following structure:
         {{
-            "commands": ["new_command_to_try"],
-            "explanation": "A brief explanation of why the previous command failed and why this new command should work."
+            "thought": "A brief thought process on how you're creating the plan.",
+            "plan": [
+                "Step 1: Description of the first logical step.",
+                "Step 2: Description of the second logical step.",
+                "..."
+            ]
         }}
 
-        If you believe the error is unrecoverable, respond with an empty "commands" or "tool" field and an explanation.
-        Only include the JSON in your response, nothing else.
-        """
-        return self._send_request(prompt)
-
-    def generate_next_action(self, conversation_history: List[Dict[str, str]], user_instruction: str) -> Dict[str, Any]:
-        """
-        Generates the next action for the autonomous agent, which can be a tool call or a shell command.
+        User's Goal: {user_instruction}
         """
-        prompt = self._construct_agent_prompt(conversation_history, user_instruction)
-        try:
-            response = self.model.generate_content(prompt)
-            return self._parse_json_response(response.text)
-        except Exception as e:
-            logger.error(f"Error generating next agent action: {e}")
-            return {"error": str(e)}
 
-    def generate_audit_report(self, code: str) -> Dict[str, Any]:
-        """Generates a security audit report for a piece of code."""
-        prompt = f"""
+_CODE_AUDIT_PROMPT: Final[str] = """
 You are an expert cybersecurity analyst. Your task is to audit the following Python code for any potential security
 vulnerabilities.
 
@@ -297,26 +170,8 @@ Respond with a single JSON object with two keys:
 2.  `report`: A detailed, multi-line report in Markdown format. If you find vulnerabilities, describe them and suggest
     specific fixes. If you find no issues, state that.
 """
-        return self._send_request(prompt)
 
-    def _send_request(self, prompt: str) -> Dict[str, Any]:
-        """Sends a request to the Gemini API and handles the response."""
-        try:
-            response = self.model.generate_content(prompt)
-            # Basic parsing, assuming JSON is the primary output format
-            return self._parse_json_response(response.text)
-        except Exception as e:
-            logger.error(f"Error calling Gemini API: {e}")
-            return {"error": str(e)}
-
-    def reset_chat(self):
-        """Resets the chat history."""
-        self.chat = self.model.start_chat(history=[])
-        logger.info("Chat history has been reset.")
-
-    def _construct_shell_command_prompt(self, instruction: str) -> str:
-        """Constructs the prompt for generating simple shell commands."""
-        return f"""
+_SHELL_COMMANDS_PROMPT: Final[str] = """
 You are an expert Linux terminal assistant. Your task is to convert a natural language instruction into a sequence of executable Linux shell commands.
 
 **Constraints:**
@@ -333,55 +188,7 @@ You are an expert Linux terminal assistant. Your task is to convert a natural la
 **JSON Output:**
 """
 
-    def _construct_agent_prompt(self, conversation_history: List[Dict[str, str]], user_instruction: str) -> str:
-        """Constructs the prompt for the autonomous agent."""
-        # For now, we don't have tools, so this is a simplified prompt.
-        # We will add tool definitions back in when we implement tool usage.
-        
-        history_str = "\n".join([f"{msg['role']}: {msg['content']}" for msg in conversation_history])
-
-        return f"""
-You are Owl, a helpful and friendly AI assistant operating on a Linux system.
-Your goal is to have a conversation with the user and help them with their tasks.
-
-**Conversation History:**
-{history_str}
-
-**User's Latest Instruction:**
-"{user_instruction}"
-
-Based on the conversation, provide a helpful response.
-For now, just respond with a simple JSON object like this:
-{{
-    "response": "Your friendly response here."
-}}
-"""
-
-    def _get_tool_definitions(self) -> str:
-        """Formats the TOOL_CONFIG into a string for the prompt."""
-        lines = []
-        for name, config in TOOL_CONFIG.items():
-            arg_str = ", ".join([f"{k}: {v}" for k, v in config.get("args", {}).items()])
-            lines.append(f"- `{name}({arg_str})`: {config['description']}")
-        return "\n".join(lines)
-
-    def _parse_json_response(self, response_text: str) -> Dict[str, Any]:
-        """Safely parses a JSON string from the model's response."""
-        try:
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0]
-            
-            return json.loads(response_text)
-        except (json.JSONDecodeError, IndexError) as e:
-            logger.error(f"Failed to parse JSON response: '{response_text}'. Error: {e}")
-            return {"error": "Invalid or unexpected response format from the model."}
-        except Exception as e:
-            logger.error(f"An unexpected error occurred during JSON parsing: {e}")
-            return {"error": "An unexpected error occurred."}
-
-    def generate_explanation(self, code: str) -> Dict[str, Any]:
-        """Generates an explanation for a piece of code."""
-        prompt = f"""
+_EXPLANATION_PROMPT: Final[str] = """
 You are an expert software engineer. Your task is to explain the following code snippet in a clear, concise way.
 Focus on the code's purpose, how it works, and its key components. The output should be in Markdown format.
 
@@ -392,15 +199,8 @@ Focus on the code's purpose, how it works, and its key components. The output sh
 
 **Explanation (in Markdown):**
 """
-        try:
-            response = self.model.generate_content(prompt)
-            return {"explanation": response.text}
-        except Exception as e:
-            return {"error": str(e)}
 
-    def generate_docstring(self, code: str) -> Dict[str, Any]:
-        """Generates a docstring for a function or class."""
-        prompt = f"""
+_DOCSTRING_PROMPT: Final[str] = """
 You are a senior Python developer who writes excellent documentation.
 Generate a high-quality, Google-style docstring for the following code.
 
@@ -421,11 +221,8 @@ The value for "docstring" MUST be a single JSON string, with all newlines and sp
 
 Now, generate the response for the code provided.
 """
-        return self._send_request(prompt)
 
-    def generate_test(self, code: str) -> Dict[str, Any]:
-        """Generates a unit test for a piece of code."""
-        prompt = f"""
+_TEST_PROMPT: Final[str] = """
 You are a software engineer specializing in Test-Driven Development.
 Write a simple unit test for the following code using the `unittest` library.
 The test should be self-contained in a single file.
@@ -437,11 +234,8 @@ The test should be self-contained in a single file.
 
 Respond with a single JSON object containing one key, "test_code", with the generated Python test code as its value.
 """
-        return self._send_request(prompt)
 
-    def generate_commit_message(self, diff: str) -> Dict[str, Any]:
-        """Generates a git commit message from a diff."""
-        prompt = f"""
+_COMMIT_MESSAGE_PROMPT: Final[str] = """
 You are a senior software engineer who writes excellent, conventional git commit messages.
 Based on the following `git diff --staged` output, generate a concise and descriptive commit message.
 
@@ -456,11 +250,8 @@ The commit message should follow the Conventional Commits specification:
 
 Respond with a single JSON object containing one key, "commit_message", with the generated message as its value.
 """
-        return self._send_request(prompt)
 
-    def generate_refactor(self, code: str, instruction: str) -> Dict[str, Any]:
-        """Generates a refactored version of a piece of code."""
-        prompt = f"""
+_REFACTOR_PROMPT: Final[str] = """
 You are an expert software engineer who specializes in writing clean, efficient, and maintainable code.
 Your task is to refactor the following code snippet based on the user's instruction.
 The refactored code must maintain the original functionality.
@@ -476,11 +267,8 @@ The refactored code must maintain the original functionality.
 Respond with a single JSON object containing one key, "refactored_code", with the newly refactored code as its value.
 Only provide the code for the function/class that was refactored.
 """
-        return self._send_request(prompt)
 
-    def generate_fix(self, code: str, error_message: str) -> Dict[str, Any]:
-        """Generates a fix for a piece of code based on a traceback."""
-        prompt = f"""
+_FIX_PROMPT: Final[str] = """
 You are an expert software engineer and debugger. Your task is to analyze the following code and its error message,
 and then provide a corrected version of the code and an explanation of the fix.
 
@@ -500,11 +288,8 @@ Respond with a single JSON object with two keys:
 
 Your JSON response should be valid and well-formatted.
 """
-        return self._send_request(prompt)
 
-    def generate_shell_command(self, instruction: str) -> Dict[str, Any]:
-        """Generates a shell command from a natural language instruction."""
-        prompt = f"""
+_SHELL_COMMAND_PROMPT: Final[str] = """
 You are an expert Linux terminal assistant. Your task is to convert a natural language instruction into a sequence of
 executable Linux shell commands.
 
@@ -520,8 +305,1012 @@ executable Linux shell commands.
 
 **JSON Output:**
 """
+
+_CORRECTION_PROMPT_SUFFIX: Final[str] = """
+Here is the conversation history leading to the failure:
+{history}
+
+The action that FAILED was:
+`{failed_action}`
+
+Its output was:
+---
+STDOUT:
+{stdout}
+---
+STDERR:
+{stderr}
+---
+
+{override}
+
+Analyze the error and the user's instructions. Generate a new action to recover from this error and continue the conversation.
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class HistoryItem:
+    """
+    One entry of the agent's execution history.
+
+    Slotted, so entries are compact and prompt building reads attributes instead of doing dict lookups.
+    `result` stays a dict because executor and tool results don't share one shape.
+    """
+    action: str = "unknown"
+    step: Optional[str] = None
+    instruction: Optional[str] = None
+    content: Optional[str] = None
+    commands: Tuple[str, ...] = ()
+    args: Dict[str, Any] = field(default_factory=dict)
+    explanation: Optional[str] = None
+    result: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, entry: Dict[str, Any]) -> "HistoryItem":
+        """Builds an item from the dict form of a history entry."""
+        return cls(
+            action=entry.get("action", "unknown"),
+            step=entry.get("step"),
+            instruction=entry.get("instruction"),
+            content=entry.get("content"),
+            commands=tuple(entry.get("commands") or ()),
+            args=entry.get("args") or {},
+            explanation=entry.get("explanation"),
+            result=entry.get("result") or {},
+        )
+
+
+def _format_history(history: List[Union[HistoryItem, Dict[str, Any]]], mode: str = "conversational") -> str:
+    """
+    Renders history entries for a prompt, collecting the lines in a list and joining them once.
+
+    "detailed" lists each plan step with its action, outcome and output. "conversational" renders one
+    "Actor: content" line per entry and also accepts chat-style {"role", "content"} messages.
+    Plain dict entries are accepted and converted with HistoryItem.from_dict.
+    """
+    parts: List[str] = []
+    for item in history:
+        if isinstance(item, dict):
+            if mode != "detailed" and 'role' in item:
+                parts.append(f"{item['role']}: {item['content']}")
+                continue
+            item = HistoryItem.from_dict(item)
+        action = item.action
+        result = item.result
+        # Split "tool:<name>" once instead of testing and splitting the prefix separately per branch.
+        kind, _, tool_name = action.partition(':')
+
+        if mode == "detailed":
+            parts.append(f"- Step: {item.step}")
+            if action == 'shell':
+                parts.append(f"  - Action: Ran shell command `{' && '.join(item.commands)}`")
+            elif kind == 'tool':
+                parts.append(f"  - Action: Used tool `{tool_name}` with args `{item.args}`")
+
+            parts.append(f"  - Outcome: {'Success' if result.get('success') else 'Failure'}")
+
+            output = result.get('output')  # For tools
+            if output is None:  # For shell commands
+                stdout = result.get('stdout', '')
+                stderr = result.get('stderr', '')
+                output = f"STDOUT: {stdout}\n  - STDERR: {stderr}" if stdout or stderr else "No output."
+            parts.append(f"  - Output: {output}")
+            continue
+
+        if action == 'user_instruction':
+            parts.append(f"User: {item.instruction or ''}")
+        elif action == 'summary':
+            parts.append(f"Summary of earlier turns: {item.content or ''}")
+        else:
+            content = ""
+            if action == 'shell':
+                content = f"Ran command: `{' && '.join(item.commands)}`"
+            elif kind == 'tool':
+                content = f"Used tool: `{tool_name}` with args `{item.args}`"
+
+            outcome = "Success" if result.get('success', False) else "Failed"
+            parts.append(f"Agent: {content} -> {outcome}. Output: {result.get('output', 'None')}")
+    return "\n".join(parts)
+
+
+@functools.lru_cache(maxsize=32)
+def _format_plan(plan: Tuple[str, ...]) -> str:
+    """Numbers the steps of a plan; the same plan is formatted once for all of its steps."""
+    return "\n".join(f"{i + 1}. {step}" for i, step in enumerate(plan))
+
+
+@functools.lru_cache(maxsize=None)
+def _tool_definitions() -> str:
+    """Lists the tools in TOOL_CONFIG for a prompt. TOOL_CONFIG is fixed at import, so this is built once."""
+    lines = []
+    for name, config in TOOL_CONFIG.items():
+        arg_str = ", ".join([f"{k}: {v}" for k, v in config.get("args", {}).items()])
+        lines.append(f"- `{name}({arg_str})`: {config['description']}")
+    return "\n".join(lines)
+
+
+# Used to size the agent prompt when the model's limits can't be queried, and to estimate tokens locally.
+_DEFAULT_INPUT_TOKEN_LIMIT = 32768
+_CHARS_PER_TOKEN = 4
+# Tokens left free for the model's response.
+_RESPONSE_TOKEN_RESERVE = 2048
+
+# Sections of a system audit report and the audit data keys each one reviews. Audit data keys that are not
+# listed anywhere go to the section with no keys of its own.
+_AUDIT_SECTIONS: Final[Dict[str, Tuple[str, ...]]] = {
+    "Policy Compliance": ("policies",),
+    "Software Inventory": ("packages",),
+    "Security Events": ("windows_security_events",),
+    "System Configuration": (),
+}
+
+# Cosine similarity above which a repeated instruction is treated as the same request within a session.
+_REPEAT_SIMILARITY = 0.97
+
+# Characters that change nesting or string state while scanning for the end of a JSON value.
+_JSON_DELIMITERS = re.compile(r'[{}\[\]"\\]')
+
+
+def _extract_json(text: str) -> str:
+    """
+    Returns the first complete JSON object or array in a model response.
+
+    Scanning starts after a ```json fence if there is one and tracks nesting depth and string state in a
+    single pass, so fences or braces inside JSON strings (e.g. Markdown in an audit report) don't end it early.
+    If no balanced value is found, the remaining text is returned for the JSON parser to reject.
+    """
+    fence = text.find("```json")
+    offset = fence + len("```json") if fence != -1 else 0
+    starts = [i for i in (text.find("{", offset), text.find("[", offset)) if i != -1]
+    if not starts:
+        return text[offset:]
+    start = min(starts)
+
+    depth = 0
+    in_string = False
+    escaped_at = -1
+    for match in _JSON_DELIMITERS.finditer(text, start):
+        pos = match.start()
+        if pos == escaped_at:
+            continue
+        char = text[pos]
+        if in_string:
+            if char == "\\":
+                escaped_at = pos + 1
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:pos + 1]
+    return text[start:]
+
+
+class _JsonStreamScanner:
+    """
+    Finds the end of a JSON value in a streamed model response as the chunks arrive.
+
+    Only responses that open with the value, bare or after a ```json fence, are tracked; for anything else
+    `value` stays None and the full text is left to _extract_json. Each chunk is scanned once, with the
+    nesting depth and string state carried over to the next one.
+    """
+
+    _FENCE = "```json"
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.value: Optional[str] = None
+        self._length = 0
+        self._start: Optional[int] = None
+        self._tracking = True
+        self._depth = 0
+        self._in_string = False
+        self._escaped_at = -1
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def feed(self, chunk: str) -> bool:
+        """Adds a chunk and returns True once the JSON value is complete."""
+        offset = self._length
+        self.parts.append(chunk)
+        self._length += len(chunk)
+        if self.value is not None or not self._tracking:
+            return self.value is not None
+
+        scan_from = 0
+        if self._start is None:
+            text = self.text
+            head = text.lstrip()
+            if head.startswith(self._FENCE):
+                head = head[len(self._FENCE):].lstrip()
+            elif self._FENCE.startswith(head):
+                return False  # Empty so far, or a fence that hasn't fully arrived
+            if not head:
+                return False
+            if head[0] not in "{[":
+                self._tracking = False
+                return False
+            self._start = len(text) - len(head)
+            scan_from = self._start - offset
+
+        for match in _JSON_DELIMITERS.finditer(chunk, scan_from):
+            pos = offset + match.start()
+            if pos == self._escaped_at:
+                continue
+            char = match.group()
+            if self._in_string:
+                if char == "\\":
+                    self._escaped_at = pos + 1
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.value = self.text[self._start:pos + 1]
+                    return True
+        return False
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    """Scales a vector to unit length, so cosine similarity is a dot product."""
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+# SDK state shared by every GeminiClient in the process. genai.configure() sets process-wide options, models
+# are reused across clients, and the SDK's async client binds to the event loop it is first used on, so all
+# clients run their async calls on one loop.
+_sdk_lock = threading.Lock()
+_configured_api_key: Optional[str] = None
+_shared_models: Dict[Tuple[str, str, str], Any] = {}
+_async_loop: Optional[asyncio.AbstractEventLoop] = None
+
+# Attempts made for a model call that is rejected by rate limiting or a temporarily unavailable service.
+_MAX_ATTEMPTS = 3
+
+# Minimum similarity for replaying shell commands cached for a paraphrase. A looser match can swap in a command
+# written for another path or flag, so this is stricter than the cache-wide threshold.
+SHELL_COMMAND_SIMILARITY = 0.95
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff with jitter, so concurrent callers don't retry in lockstep."""
+    return 2 ** attempt + random.random()
+
+
+def _retry_transient(fn):
+    """
+    Retries a model call on rate limiting (429 RESOURCE_EXHAUSTED) or 503 UNAVAILABLE with exponential backoff.
+    Other errors, and the last failed attempt, propagate to the caller's own error handling.
+    """
+    def is_transient(error: Exception) -> bool:
+        from google.api_core import exceptions
+        return isinstance(error, (exceptions.ResourceExhausted, exceptions.ServiceUnavailable))
+
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            for attempt in range(_MAX_ATTEMPTS):
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception as e:
+                    if attempt == _MAX_ATTEMPTS - 1 or not is_transient(e):
+                        raise
+                    logger.warning(f"Model call failed ({e}); retrying.")
+                    await asyncio.sleep(_backoff_delay(attempt))
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        for attempt in range(_MAX_ATTEMPTS):
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt == _MAX_ATTEMPTS - 1 or not is_transient(e):
+                    raise
+                logger.warning(f"Model call failed ({e}); retrying.")
+                time.sleep(_backoff_delay(attempt))
+    return wrapper
+
+
+class RemediationPlan(TypedDict):
+    """Response schema for a single entry of a batched remediation request."""
+    policy: str
+    details: str
+    remediation: str
+
+
+class ShellCommandResponse(TypedDict):
+    """Response schema for shell command generation."""
+    commands: list[str]
+    explanation: str
+
+
+class PlanResponse(TypedDict):
+    """Response schema for plan generation."""
+    thought: str
+    plan: list[str]
+
+
+class AuditReport(TypedDict):
+    """Response schema for a code audit report."""
+    summary: str
+    report: str
+
+
+class GeminiClient:
+    """A client for interacting with the Google Gemini API."""
+
+    def __init__(self, api_key: str, model: str = "gemini-1.5-pro-latest", summary_model: str = "gemini-1.5-flash-8b"):
+        """
+        Initializes the GeminiClient.
+
+        Args:
+            api_key: The Google API key.
+            model: The model to use for generation.
+            summary_model: A small, cheap model used to compact conversation history.
+        """
+        self.api_key = api_key
+        self.model_name = model
+        # Imported here rather than at module level: the SDK import chain dominates CLI start-up time,
+        # and commands that never talk to the model shouldn't pay for it.
+        import google.generativeai as genai
+        from google.generativeai.types import GenerationConfig
+
+        # The SDK creates one gRPC client per service on first use and caches it, so every model below and
+        # every call shares a single pooled, kept-alive channel. Leave `transport` unset: forcing "grpc" would
+        # also hand the async client a blocking transport and break generate_batch.
+        global _configured_api_key
+        with _sdk_lock:
+            if _configured_api_key != self.api_key:
+                genai.configure(api_key=self.api_key)
+                _configured_api_key = self.api_key
+
+        def shared_model(role: str, name: str, **options):
+            with _sdk_lock:
+                key = (self.api_key, name, role)
+                if key not in _shared_models:
+                    _shared_models[key] = genai.GenerativeModel(name, **options)
+                return _shared_models[key]
+
+        self.model = shared_model("plain", self.model_name)
+        # JSON mode: the server returns bare JSON, so responses parse without fence or prose handling.
+        self.json_model = shared_model(
+            "json",
+            self.model_name,
+            generation_config=GenerationConfig(response_mime_type="application/json"),
+        )
+        # Built once so every agent turn reuses the same system instruction and generation settings.
+        self.agent_model = shared_model(
+            "agent",
+            self.model_name,
+            system_instruction=AGENT_SYSTEM_PROMPT,
+            generation_config=GenerationConfig(candidate_count=1, response_mime_type="application/json"),
+        )
+        self.summary_model = shared_model("plain", summary_model)
+        self.config = get_config()
+        self.chat = self.model.start_chat(history=[])
+        # (scope, instruction, normalized embedding or None until one is needed, response) of recent
+        # instruction-driven responses in this session.
+        self._recent_instructions: Deque[Tuple[str, str, Optional[List[float]], Dict[str, Any]]] = deque(maxlen=16)
+        # (history and instruction signature, response) of the last agent turn.
+        self._last_next_action: Optional[Tuple[str, Dict[str, Any]]] = None
+        logger.info(f"Initialized Gemini client with model: {self.model.model_name}")
+
+    def _get_command_generation_prompt(self) -> str:
+        """Constructs the prompt for generating shell commands."""
+        config = self.config
+        base_prompt = config.custom_prompt or """
+        You are a helpful assistant that translates natural language instructions into shell commands.
+        Your task is to:
+        1. Understand the user's intention from their natural language request.
+        2. Generate the appropriate shell command(s) to accomplish that task.
+        3. Provide a brief explanation of what each command does.
+        
+        Respond with a JSON object with the following structure:
+        {
+            "commands": ["command1", "command2", ...],
+            "explanation": "Brief explanation of what these commands do"
+        }
+        
+        Only include the JSON in your response, nothing else.
+        """
+
+        return f"""
+        {base_prompt}
+        """
+
+    def generate_shell_commands(self, instruction: str) -> Dict[str, Any]:
+        """
+        Generates shell commands from a natural language instruction.
+        This is used for the 'run' command.
+        """
+        prompt = self._construct_shell_command_prompt(instruction)
+        return self._send_request(prompt, response_schema=ShellCommandResponse, **self._shell_command_semantics("shell_commands", instruction))
+
+    def generate_plan(self, user_instruction: str) -> Dict[str, Any]:
+        """Generate a step-by-step plan from a high-level instruction."""
+        prompt = _PLAN_PROMPT.format(user_instruction=user_instruction)
+        return self._send_request(prompt, response_schema=PlanResponse)
+
+    def generate_command_for_step(self, goal: str, plan: List[str], history: List[Dict[str, Any]], current_step: str, override_instruction: Optional[str] = None) -> Dict[str, Any]:
+        """Generates a command for a specific step in a plan, considering the history."""
+        history_str = ""
+        if history:
+            history_str = "Here is the history of what has been done so far:\n" + _format_history(history, mode="detailed")
+        
+        override_prompt_part = ""
+        if override_instruction:
+            override_prompt_part = f"""
+            The user has provided a new instruction to correct or guide the next action.
+            User's Correction: "{override_instruction}"
+            You MUST prioritize this instruction. Generate an action that follows the user's new guidance for the current step.
+            """
+        
+        # The static instructions come first and everything specific to this run last, so the prefix can be cached.
+        prompt = STEP_PROMPT_PREAMBLE + _STEP_PROMPT_SUFFIX.format(
+            goal=goal,
+            plan=_format_plan(tuple(plan)),
+            history=history_str,
+            override=override_prompt_part,
+            current_step=current_step,
+        )
+        return self._send_request(prompt, bypass_cache=override_instruction is not None)
+
+    def generate_correction(self, history: List[Dict[str, Any]], failed_action: str, stdout: str, stderr: str, override_instruction: Optional[str] = None) -> Dict[str, Any]:
+        """Generates a new action to correct a failed action in a conversational context."""
+        # Use the same history formatting as generate_next_action
+        history_str = "This is the conversation history so far:\n" + _format_history(history)
+
+        override_prompt_part = ""
+        if override_instruction:
+            override_prompt_part = f"""
+            The user has provided a new instruction to guide the correction.
+            User's Correction: "{override_instruction}"
+            You MUST prioritize this instruction.
+            """
+
+        # The static instructions come first and everything specific to this failure last, so the prefix can be cached.
+        prompt = CORRECTION_PROMPT_PREAMBLE + _CORRECTION_PROMPT_SUFFIX.format(
+            history=history_str,
+            failed_action=failed_action,
+            stdout=stdout,
+            stderr=stderr,
+            override=override_prompt_part,
+        )
+        if not override_instruction:
+            return self._send_request(prompt)
+
+        # A repeated correction ("no, only .py files") for the same failure gets the answer it got last time.
+        scope = f"correction\0{failed_action}\0{stderr}"
+        embedding, repeated = self._recent_lookup(scope, override_instruction)
+        if repeated is not None:
+            return repeated
+        result = self._send_request(prompt, bypass_cache=True)
+        self._recent_store(scope, override_instruction, result, embedding)
+        return result
+
+    def generate_next_action(self, conversation_history: List[Dict[str, str]], user_instruction: str) -> Dict[str, Any]:
+        """
+        Generates the next action for the autonomous agent, which can be a tool call or a shell command.
+        """
+        # Only an identical instruction on an unchanged history reuses the last answer. Any new turn changes the
+        # history, so "try again" after something happened is always sent, and no embedding call is needed.
+        key = semantic_cache.signature([{"history": conversation_history, "instruction": user_instruction.strip()}])
+        if self._last_next_action is not None and self._last_next_action[0] == key:
+            logger.info("Reusing the response to the identical previous turn.")
+            return self._last_next_action[1]
+        prompt = self._construct_agent_prompt(conversation_history, user_instruction)
+        try:
+            response = self._generate(self.agent_model, prompt)
+            result = self._parse_json_response(response.text)
+        except Exception as e:
+            logger.error(f"Error generating next agent action: {e}")
+            return {"error": str(e)}
+        if "error" not in result:
+            self._last_next_action = (key, result)
+        return result
+
+    def stream_next_action(self, conversation_history: List[Dict[str, Any]], user_instruction: str, on_chunk: Callable[[str], None]) -> Dict[str, Any]:
+        """
+        Streams the next agent action, passing each text chunk to `on_chunk` as it arrives.
+        The JSON is parsed as soon as the action object is complete.
+        """
+        prompt = self._construct_agent_prompt(conversation_history, user_instruction)
+        try:
+            return self._read_json_stream(self._generate(self.agent_model, prompt, stream=True), on_chunk)
+        except Exception as e:
+            logger.error(f"Error streaming next agent action: {e}")
+            return {"error": str(e)}
+
+    def summarize(self, entries: List[Dict[str, Any]]) -> str:
+        """
+        Condenses a run of agent history entries into a short plain-text summary.
+        Returns an empty string on failure so the caller can fall back to dropping the entries.
+        """
+        prompt = f"""
+Summarize the following agent history entries in a few sentences. Keep the user's goals, the actions
+that were taken, their outcomes, and any file names, paths or values that later steps may depend on.
+Respond with plain text only.
+
+**History:**
+```json
+{jsonutil.dumps(entries)}
+```
+"""
+        try:
+            response = self._generate(self.summary_model, prompt)
+            return response.text.strip()
+        except Exception as e:
+            logger.error(f"Error summarizing history: {e}")
+            return ""
+
+    def embed(self, text: str) -> List[float]:
+        """Returns the embedding vector for a piece of text."""
+        import google.generativeai as genai
+        result = genai.embed_content(model="models/text-embedding-004", content=text, task_type="semantic_similarity")
+        return result["embedding"]
+
+    def generate_batch_remediation(self, violations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Generates remediation plans for all policy violations with a single request.
+        Returns one plan per violation, in input order, or an empty list on failure.
+        """
+        prompt = f"""
+You are an expert systems administrator. The following policy violations were detected on this machine.
+For each violation below, produce a concise remediation plan. Return the plans as a JSON array in the
+same order as the input, one entry per violation.
+
+**Violations:**
+```json
+{jsonutil.dumps(violations)}
+```
+"""
+        # JSON mode with a schema makes the server return a well-formed array, so no fence-stripping is needed.
+        try:
+            response = self._generate(self.json_model, prompt, generation_config={"response_schema": list[RemediationPlan]})
+            return jsonutil.loads(response.text)
+        except Exception as e:
+            logger.error(f"Error generating batch remediation: {e}")
+            return []
+
+    def generate_audit_report(self, code: str, on_chunk: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """
+        Generates a security audit report for a piece of code.
+        Reports are long, so `on_chunk` receives the response text as it streams in.
+        """
+        prompt = _CODE_AUDIT_PROMPT.format(code=code)
+        return self._send_request(prompt, on_chunk=on_chunk, response_schema=AuditReport)
+
+    def generate_system_audit_report(self, audit_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Generates a security audit report from data collected on the local system.
+
+        Each report section is requested separately with only its slice of the data, and the requests run
+        concurrently. The section summaries form the executive summary. Large slices (package lists, event
+        logs) are summarized to fit the prompt rather than dropped.
+        """
+        claimed = {key for keys in _AUDIT_SECTIONS.values() for key in keys}
+        sections = []
+        for title, keys in _AUDIT_SECTIONS.items():
+            data = {key: value for key, value in audit_data.items() if (key in keys if keys else key not in claimed)}
+            if data:
+                sections.append((title, data))
+
+        results = self.generate_batch([self._construct_audit_section_prompt(title, data) for title, data in sections])
+        if all("error" in result for result in results):
+            return results[0] if results else {"error": "No audit data to report on."}
+
+        summaries, summary_lines, bodies = [], [], []
+        for (title, _), result in zip(sections, results):
+            if "error" in result:
+                bodies.append(f"## {title}\n\n_This section could not be generated: {result['error']}_")
+                continue
+            summaries.append(result.get("summary", ""))
+            summary_lines.append(f"- **{title}:** {summaries[-1]}")
+            bodies.append(f"## {title}\n\n{result.get('report', '')}")
+
+        report = "\n\n".join(["## Executive Summary\n\n" + "\n".join(summary_lines)] + bodies)
+        return {"summary": " ".join(summaries), "report": report}
+
+    def _send_request(
+        self,
+        prompt: str,
+        bypass_cache: bool = False,
+        semantic_key: Optional[Tuple[str, str]] = None,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        response_schema: Optional[Any] = None,
+        semantic_threshold: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Sends a request to the Gemini API and handles the response.
+
+        The response is streamed and each text chunk is passed to `on_chunk` as it arrives; the JSON is
+        parsed as soon as it is complete.
+        Successful responses are cached by model and prompt; pass `bypass_cache` for prompts whose answer should not be replayed.
+        `semantic_key` is a (scope, text) pair: when given, a response cached for a paraphrase of `text` within the
+        same scope is reused as well, if it clears `semantic_threshold` (by default the cache's own threshold).
+        Requests use JSON mode; `response_schema` additionally constrains the response to a schema.
+        """
+        key, cached = self._cache_lookup(prompt, bypass_cache)
+        if cached is not None:
+            return cached
+        embedding = None
+        if semantic_key and not bypass_cache:
+            embedding, cached = self._semantic_lookup(*semantic_key, threshold=semantic_threshold)
+            if cached is not None:
+                return cached
+        try:
+            generation_config = {"response_schema": response_schema} if response_schema is not None else None
+            stream = self._generate(self.json_model, prompt, generation_config=generation_config, stream=True)
+            result = self._read_json_stream(stream, on_chunk)
+        except Exception as e:
+            logger.error(f"Error calling Gemini API: {e}")
+            return {"error": str(e)}
+        self._cache_store(key, result)
+        if semantic_key and key is not None and "error" not in result:
+            self._semantic_store(*semantic_key, result, embedding)
+        return result
+
+    @_retry_transient
+    def _generate(self, model, prompt: str, **kwargs):
+        """Calls `model.generate_content`, the single place model calls are retried on transient errors."""
+        return model.generate_content(prompt, **kwargs)
+
+    @_retry_transient
+    async def _generate_async(self, model, prompt: str, **kwargs):
+        """Async counterpart of _generate."""
+        return await model.generate_content_async(prompt, **kwargs)
+
+    def _read_json_stream(self, stream, on_chunk: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """
+        Reads a streamed response and parses the JSON value in it.
+        Reading stops once the value is complete, so a trailing fence or remark isn't waited for.
+        """
+        scanner = _JsonStreamScanner()
+        for chunk in stream:
+            text = chunk.text
+            if on_chunk:
+                on_chunk(text)
+            if scanner.feed(text):
+                return self._parse_json_response(scanner.value, extracted=True)
+        return self._parse_json_response(scanner.text)
+
+    def _semantic_signature(self, scope: str) -> str:
+        return semantic_cache.signature([{"model": self.model_name, "scope": scope}])
+
+    def _shell_command_semantics(self, scope: str, instruction: str) -> Dict[str, Any]:
+        """
+        Semantic cache options for shell command generation. Commands that will run without confirmation are
+        never replayed from a paraphrase, and otherwise the match must clear SHELL_COMMAND_SIMILARITY.
+        """
+        if self.config.auto_execute:
+            return {}
+        threshold = max(self.config.cache_similarity_threshold, SHELL_COMMAND_SIMILARITY)
+        return {"semantic_key": (scope, instruction), "semantic_threshold": threshold}
+
+    def _try_embed(self, text: str) -> Optional[List[float]]:
+        try:
+            return self.embed(text)
+        except Exception as e:
+            logger.warning(f"Could not embed text for the semantic cache: {e}")
+            return None
+
+    def _semantic_lookup(self, scope: str, text: str, threshold: Optional[float] = None) -> tuple[Optional[List[float]], Optional[Dict[str, Any]]]:
+        """Returns the embedding of `text` (if one was computed) and a response cached for a paraphrase of it."""
+        signature = self._semantic_signature(scope)
+        if not semantic_cache.has_entries(signature):
+            return None, None
+        embedding = self._try_embed(text)
+        return embedding, (semantic_cache.get(signature, embedding, threshold=threshold) if embedding else None)
+
+    def _semantic_store(self, scope: str, text: str, result: Dict[str, Any], embedding: Optional[List[float]] = None):
+        """Records a response so later paraphrases of `text` in the same scope can reuse it."""
+        embedding = embedding or self._try_embed(text)
+        if embedding:
+            semantic_cache.set(self._semantic_signature(scope), embedding, result)
+
+    def _recent_lookup(self, scope: str, text: str) -> tuple[Optional[List[float]], Optional[Dict[str, Any]]]:
+        """
+        Returns the normalized embedding of `text` (if one was computed) and the response to a recent
+        instruction in the same scope that means the same thing. Nothing is embedded while the scope is empty
+        or when the same instruction was given verbatim.
+        """
+        entries = [(i, entry) for i, entry in enumerate(list(self._recent_instructions)) if entry[0] == scope]
+        if not entries:
+            return None, None
+        for _, (_, recent_text, _, response) in reversed(entries):
+            if recent_text == text.strip():
+                logger.info("Reusing the response to a repeated recent instruction.")
+                return None, response
+        embedding = self._try_embed(text)
+        if not embedding:
+            return None, None
+        embedding = _normalize(embedding)
+        for i, (_, recent_text, recent, response) in reversed(entries):
+            if recent is None:
+                # Stored entries are only embedded once a later instruction has to be compared with them
+                recent = self._try_embed(recent_text)
+                if not recent:
+                    continue
+                recent = _normalize(recent)
+                self._recent_instructions[i] = (scope, recent_text, recent, response)
+            if sum(a * b for a, b in zip(embedding, recent)) >= _REPEAT_SIMILARITY:
+                logger.info("Reusing the response to an equivalent recent instruction.")
+                return embedding, response
+        return embedding, None
+
+    def _recent_store(self, scope: str, text: str, result: Dict[str, Any], embedding: Optional[List[float]] = None):
+        """
+        Remembers a successful response so an equivalent instruction later in the session can reuse it.
+        `embedding` is the already normalized one from `_recent_lookup`; without it nothing is embedded yet.
+        Nothing is kept while the semantic cache is disabled.
+        """
+        if "error" in result or semantic_cache.ttl <= 0:
+            return
+        self._recent_instructions.append((scope, text.strip(), embedding, result))
+
+    def _cache_lookup(self, prompt: str, bypass_cache: bool) -> tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """Returns the cache key for a prompt (None when bypassed) and the cached response, if any."""
+        if bypass_cache:
+            return None, None
+        key = llm_cache.prompt_key(self.model_name, prompt)
+        cached = llm_cache.get(key)
+        if cached is not None:
+            logger.info("Serving response from cache.")
+        return key, cached
+
+    def _cache_store(self, key: Optional[str], result: Dict[str, Any]):
+        """Caches a parsed response unless it is an error or caching was bypassed."""
+        if key is not None and "error" not in result:
+            llm_cache.set(key, result)
+
+    async def _send_request_async(self, prompt: str, bypass_cache: bool = False) -> Dict[str, Any]:
+        """Async counterpart of _send_request, so several requests can be in flight at once."""
+        key, cached = self._cache_lookup(prompt, bypass_cache)
+        if cached is not None:
+            return cached
+        try:
+            response = await self._generate_async(self.json_model, prompt)
+            result = self._parse_json_response(response.text)
+        except Exception as e:
+            logger.error(f"Error calling Gemini API: {e}")
+            return {"error": str(e)}
+        self._cache_store(key, result)
+        return result
+
+    def generate_batch(self, prompts: List[str], max_concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Sends independent prompts concurrently and returns the parsed responses in input order.
+        At most `max_concurrency` requests are in flight at a time, by default the configured
+        `max_parallel_requests`, which keeps bursts under the API's rate limit.
+        """
+        max_concurrency = max(1, max_concurrency or self.config.max_parallel_requests)
+
+        async def gather():
+            semaphore = asyncio.Semaphore(max_concurrency)
+
+            async def send(prompt: str) -> Dict[str, Any]:
+                async with semaphore:
+                    return await self._send_request_async(prompt)
+
+            return await asyncio.gather(*(send(prompt) for prompt in prompts))
+
+        return list(self._run_async(gather()))
+
+    def _run_async(self, coro) -> Any:
+        """
+        Runs a coroutine on the shared background event loop and waits for the result.
+        The SDK's async transport binds to the loop it is first used on, so every async call shares one
+        long-lived loop instead of creating a new one per call with asyncio.run.
+        """
+        global _async_loop
+        with _sdk_lock:
+            if _async_loop is None:
+                _async_loop = asyncio.new_event_loop()
+                threading.Thread(target=_async_loop.run_forever, name="gemini-async", daemon=True).start()
+            loop = _async_loop
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def close(self):
+        """
+        Closes the SDK's shared gRPC channels and stops the shared background event loop.
+        No client can make requests afterwards; the shared client calls this at interpreter exit.
+        """
+        from google.generativeai import client as genai_client
+
+        global _async_loop
+        with _sdk_lock:
+            loop, _async_loop = _async_loop, None
+        try:
+            genai_client.get_default_generative_client().transport.close()
+            if loop is not None:
+                # The async channel belongs to the background loop and has to be closed on it.
+                async def close_async():
+                    await genai_client.get_default_generative_async_client().transport.close()
+
+                asyncio.run_coroutine_threadsafe(close_async(), loop).result(timeout=5)
+        except Exception as e:
+            logger.warning(f"Error closing the Gemini connection: {e}")
+        finally:
+            if loop is not None:
+                loop.call_soon_threadsafe(loop.stop)
+
+    def reset_chat(self):
+        """Resets the chat history."""
+        self.chat = self.model.start_chat(history=[])
+        logger.info("Chat history has been reset.")
+
+    def _construct_audit_section_prompt(self, section: str, data: Dict[str, Any]) -> str:
+        """Constructs the prompt for one section of a system audit report."""
+        return f"""
+You are an expert cybersecurity analyst. You are writing the "{section}" section of a security audit report.
+Review the following information collected from a system and identify security risks, misconfigurations
+and policy violations that belong in this section.
+
+Long lists and strings in the data may have been shortened; omitted parts are noted inline.
+
+**System Data:**
+```json
+{jsonutil.dumps_within_budget(data, budget=30000)}
+```
+
+Respond with a single JSON object with two keys:
+1.  `summary`: A one-sentence summary of your findings for this section.
+2.  `report`: The section body in Markdown format, without a top-level heading. Describe each finding, its
+    severity and a specific remediation. If you find no issues, state that.
+"""
+
+    def _construct_shell_command_prompt(self, instruction: str) -> str:
+        """Constructs the prompt for generating simple shell commands."""
+        return _SHELL_COMMANDS_PROMPT.format(instruction=instruction)
+
+    def _construct_agent_prompt(self, conversation_history: List[Dict[str, str]], user_instruction: str) -> str:
+        """
+        Constructs the prompt for the autonomous agent.
+
+        The constant system prompt is sent as the agent model's system instruction. After it comes the
+        history, which only grows at the end, and finally the new instruction. Consecutive calls
+        therefore share a byte-identical prefix that Gemini's implicit prompt cache can reuse.
+        """
+        # For now, we don't have tools, so this is a simplified prompt.
+        # We will add tool definitions back in when we implement tool usage.
+        history_str = self._fit_history(_format_history(conversation_history), user_instruction)
+
+        return f"""
+**Conversation History:**
+{history_str}
+
+**User's Latest Instruction:**
+"{user_instruction}"
+"""
+
+    @functools.cached_property
+    def _agent_prompt_budget(self) -> int:
+        """
+        Tokens available for history and the instruction in an agent prompt. The system prompt and the
+        model's input limit are measured once; a reserve is kept for the response.
+        """
+        import google.generativeai as genai
+        try:
+            input_limit = genai.get_model(f"models/{self.model_name}").input_token_limit
+            system_tokens = self.agent_model.count_tokens(AGENT_SYSTEM_PROMPT).total_tokens
+        except Exception as e:
+            logger.warning(f"Could not measure the agent prompt budget, using an estimate: {e}")
+            input_limit = _DEFAULT_INPUT_TOKEN_LIMIT
+            system_tokens = len(AGENT_SYSTEM_PROMPT) // _CHARS_PER_TOKEN
+        return input_limit - system_tokens - _RESPONSE_TOKEN_RESERVE
+
+    def _fit_history(self, history_str: str, user_instruction: str) -> str:
+        """
+        Drops the oldest history lines until the history and instruction fit the prompt budget.
+        Token counts for the variable parts are estimated locally so no extra request is made per turn.
+        """
+        max_chars = (self._agent_prompt_budget - len(user_instruction) // _CHARS_PER_TOKEN) * _CHARS_PER_TOKEN
+        if len(history_str) <= max_chars:
+            return history_str
+        cut = history_str.find("\n", len(history_str) - max(max_chars, 0))
+        logger.info("Trimmed the oldest conversation history to fit the model's context window.")
+        return "[Earlier history omitted]\n" + (history_str[cut + 1:] if cut != -1 else "")
+
+    def _get_tool_definitions(self) -> str:
+        """Formats the TOOL_CONFIG into a string for the prompt."""
+        return _tool_definitions()
+
+    def _parse_json_response(self, response_text: str, extracted: bool = False) -> Dict[str, Any]:
+        """
+        Safely parses a JSON string from the model's response.
+        Pass `extracted` when the text is already just the JSON value, to skip locating it again.
+        """
+        if not extracted:
+            # Bare JSON, as JSON mode returns it, is parsed directly; only fenced or chatty text is scanned.
+            stripped = response_text.strip()
+            if stripped[:1] in ("{", "[") and stripped[-1:] in ("}", "]"):
+                try:
+                    return jsonutil.loads(stripped)
+                except jsonutil.JSONDecodeError:
+                    pass
+        try:
+            if not extracted:
+                response_text = _extract_json(response_text)
+            return jsonutil.loads(response_text)
+        except (jsonutil.JSONDecodeError, IndexError) as e:
+            logger.error(f"Failed to parse JSON response: '{response_text}'. Error: {e}")
+            return {"error": "Invalid or unexpected response format from the model."}
+        except Exception as e:
+            logger.error(f"An unexpected error occurred during JSON parsing: {e}")
+            return {"error": "An unexpected error occurred."}
+
+    def generate_explanation(self, code: str) -> Dict[str, Any]:
+        """Generates an explanation for a piece of code."""
+        prompt = _EXPLANATION_PROMPT.format(code=code)
+        # The answer is Markdown rather than JSON, so it skips _send_request but shares its cache.
+        key, cached = self._cache_lookup(prompt, bypass_cache=False)
+        if cached is not None:
+            return cached
+        try:
+            response = self._generate(self.model, prompt)
+            result = {"explanation": response.text}
+        except Exception as e:
+            return {"error": str(e)}
+        self._cache_store(key, result)
+        return result
+
+    def generate_docstring(self, code: str) -> Dict[str, Any]:
+        """Generates a docstring for a function or class."""
+        prompt = _DOCSTRING_PROMPT.format(code=code)
+        return self._send_request(prompt)
+
+    def generate_test(self, code: str) -> Dict[str, Any]:
+        """Generates a unit test for a piece of code."""
+        prompt = _TEST_PROMPT.format(code=code)
+        return self._send_request(prompt)
+
+    def generate_commit_message(self, diff: str) -> Dict[str, Any]:
+        """Generates a git commit message from a diff."""
+        prompt = _COMMIT_MESSAGE_PROMPT.format(diff=diff)
+        return self._send_request(prompt)
+
+    def generate_refactor(self, code: str, instruction: str) -> Dict[str, Any]:
+        """Generates a refactored version of a piece of code."""
+        prompt = _REFACTOR_PROMPT.format(instruction=instruction, code=code)
+        # Only exact prompts are cached: instructions naming different targets ("rename foo to bar"/"... to baz")
+        # embed almost identically, so semantic replay would hand back the wrong refactoring.
         return self._send_request(prompt)
 
+    def generate_fix(self, code: str, error_message: str) -> Dict[str, Any]:
+        """Generates a fix for a piece of code based on a traceback."""
+        prompt = _FIX_PROMPT.format(error_message=error_message, code=code)
+        return self._send_request(prompt)
 
-# Create a global API client instance
-gemini_client = GeminiClient(api_key=get_config().api_key) 
\ No newline at end of file
+    def generate_shell_command(self, instruction: str, on_chunk: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """
+        Generates a shell command from a natural language instruction.
+        `on_chunk` receives the response text as it streams in; it is not called for cached responses.
+        """
+        prompt = _SHELL_COMMAND_PROMPT.format(instruction=instruction)
+        return self._send_request(
+            prompt, on_chunk=on_chunk, response_schema=ShellCommandResponse,
+            **self._shell_command_semantics("shell_command", instruction),
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def get_client() -> GeminiClient:
+    """
+    Returns the API client shared by the agent and the command handlers, creating it on first use.
+    The SDK is configured once and every call reuses the same models and transport, which is closed at exit.
+    """
+    client = GeminiClient(api_key=get_config().api_key, model=get_config().model)
+    atexit.register(client.close)
+    return client
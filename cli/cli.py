@@ -2,23 +2,70 @@ import argparse
 import sys
 from rich.console import Console
 
-from .handlers import (
-    handle_explain,
-    handle_doc,
-    handle_refactor,
-    handle_test,
-    handle_commit,
-    handle_debug,
-    handle_audit,
-    handle_run,
-    start_interactive_mode,
-)
-from .ui import display_home_page
-
 console = Console()
 
-def main():
-    """The main entry point for the Gemini CLI Coding Assistant."""
+def _add_explain_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("file_path", type=str, help="The path to the source code file.")
+    parser.add_argument("symbol", type=str, nargs="?", help="(Optional) The specific function or class to explain.")
+
+
+def _add_doc_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("file_path", type=str, help="The path to the source code file.")
+    parser.add_argument("symbol", type=str, nargs="?", help="(Optional) The specific function or class to document.")
+
+
+def _add_refactor_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("file_path", type=str, help="The path to the source code file.")
+    parser.add_argument("instruction", type=str, help="The natural language instruction for the refactoring.")
+    parser.add_argument("symbol", type=str, nargs="?", help="(Optional) The specific function or class to refactor.")
+
+
+def _add_test_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("file_path", type=str, help="The path to the source code file.")
+    parser.add_argument("symbol", type=str, nargs="?", help="(Optional) The specific function or class to generate a test for.")
+
+
+def _add_debug_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("file_path", type=str, help="The path to the source code file.")
+    parser.add_argument("error_message", type=str, help="The traceback or error message to debug.")
+
+
+def _add_audit_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("path", type=str, help="The path to the file or directory to audit.")
+    parser.add_argument("--plain", action="store_true", help="Print reports as raw Markdown instead of rendering them, which is faster for large audits.")
+
+
+def _add_run_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("instruction", type=str, nargs='+', help="The natural language instruction to execute.")
+
+
+def _add_agent_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--speculative-correction", action="store_true", default=None, help="Request a correction alongside every action, trading an extra model call for faster recovery from failures.")
+
+
+def _add_no_arguments(parser: argparse.ArgumentParser):
+    pass
+
+
+# Subcommand name -> (help text, function adding its arguments)
+_COMMANDS = {
+    "explain": ("Explains a source code file or a specific symbol within it.", _add_explain_arguments),
+    "doc": ("Generates documentation for a file or a specific symbol.", _add_doc_arguments),
+    "refactor": ("Refactors a file or symbol based on an instruction.", _add_refactor_arguments),
+    "test": ("Generates a unit test for a file or a specific symbol.", _add_test_arguments),
+    "debug": ("Debugs a file based on a traceback or error message.", _add_debug_arguments),
+    "audit": ("Audits a file or directory for security vulnerabilities.", _add_audit_arguments),
+    "run": ("Executes a shell command based on a natural language instruction.", _add_run_arguments),
+    "agent": ("Starts an interactive session with the autonomous agent.", _add_agent_arguments),
+    "commit": ("Generates a git commit message based on staged changes.", _add_no_arguments),
+}
+
+
+def _build_parser(command: str = None) -> argparse.ArgumentParser:
+    """
+    Builds the argument parser. When `command` names a known subcommand only that subparser is built,
+    otherwise (top-level flags, --help, typos) all of them are, so help and error messages list every command.
+    """
     parser = argparse.ArgumentParser(
         description="""
         Welcome to Gemini CLI, your AI Coding Assistant for the Linux Terminal.
@@ -29,70 +76,50 @@ def main():
     parser.add_argument("-i", "--interactive", action="store_true", help="Enter interactive chat mode.")
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
-    # 'explain' command
-    explain_parser = subparsers.add_parser("explain", help="Explains a source code file or a specific symbol within it.")
-    explain_parser.add_argument("file_path", type=str, help="The path to the source code file.")
-    explain_parser.add_argument("symbol", type=str, nargs="?", help="(Optional) The specific function or class to explain.")
-
-    # 'doc' command
-    doc_parser = subparsers.add_parser("doc", help="Generates documentation for a file or a specific symbol.")
-    doc_parser.add_argument("file_path", type=str, help="The path to the source code file.")
-    doc_parser.add_argument("symbol", type=str, nargs="?", help="(Optional) The specific function or class to document.")
+    names = [command] if command in _COMMANDS else _COMMANDS
+    for name in names:
+        help_text, add_arguments = _COMMANDS[name]
+        add_arguments(subparsers.add_parser(name, help=help_text))
+    return parser
 
-    # 'refactor' command
-    refactor_parser = subparsers.add_parser("refactor", help="Refactors a file or symbol based on an instruction.")
-    refactor_parser.add_argument("file_path", type=str, help="The path to the source code file.")
-    refactor_parser.add_argument("instruction", type=str, help="The natural language instruction for the refactoring.")
-    refactor_parser.add_argument("symbol", type=str, nargs="?", help="(Optional) The specific function or class to refactor.")
 
-    # 'test' command
-    test_parser = subparsers.add_parser("test", help="Generates a unit test for a file or a specific symbol.")
-    test_parser.add_argument("file_path", type=str, help="The path to the source code file.")
-    test_parser.add_argument("symbol", type=str, nargs="?", help="(Optional) The specific function or class to generate a test for.")
-
-    # 'debug' command
-    debug_parser = subparsers.add_parser("debug", help="Debugs a file based on a traceback or error message.")
-    debug_parser.add_argument("file_path", type=str, help="The path to the source code file.")
-    debug_parser.add_argument("error_message", type=str, help="The traceback or error message to debug.")
-
-    # 'audit' command
-    audit_parser = subparsers.add_parser("audit", help="Audits a file or directory for security vulnerabilities.")
-    audit_parser.add_argument("path", type=str, help="The path to the file or directory to audit.")
-
-    # 'run' command
-    run_parser = subparsers.add_parser("run", help="Executes a shell command based on a natural language instruction.")
-    run_parser.add_argument("instruction", type=str, nargs='+', help="The natural language instruction to execute.")
-
-    # 'commit' command
-    subparsers.add_parser("commit", help="Generates a git commit message based on staged changes.")
+def main():
+    """The main entry point for the Gemini CLI Coding Assistant."""
 
     # If no command is given, show the home page.
     if len(sys.argv) == 1:
+        from .ui import display_home_page
         display_home_page(console)
         sys.exit(0)
 
+    parser = _build_parser(sys.argv[1])
     args = parser.parse_args()
 
+    # Imported once the arguments are known to be valid, so --help and usage errors skip loading the handlers
+    from . import handlers
+
     if args.interactive:
-        start_interactive_mode()
+        handlers.start_interactive_mode()
         sys.exit(0)
 
     if args.command == "explain":
-        handle_explain(args.file_path, args.symbol)
+        handlers.handle_explain(args.file_path, args.symbol)
     elif args.command == "doc":
-        handle_doc(args.file_path, args.symbol)
+        handlers.handle_doc(args.file_path, args.symbol)
     elif args.command == "refactor":
-        handle_refactor(args.file_path, args.instruction, args.symbol)
+        handlers.handle_refactor(args.file_path, args.instruction, args.symbol)
     elif args.command == "test":
-        handle_test(args.file_path, args.symbol)
+        handlers.handle_test(args.file_path, args.symbol)
     elif args.command == "debug":
-        handle_debug(args.file_path, args.error_message)
+        handlers.handle_debug(args.file_path, args.error_message)
     elif args.command == "audit":
-        handle_audit(args.path)
+        handlers.handle_audit(args.path, plain=args.plain)
     elif args.command == "run":
-        handle_run(" ".join(args.instruction))
+        handlers.handle_run(" ".join(args.instruction))
+    elif args.command == "agent":
+        handlers.handle_agent(speculative_correction=args.speculative_correction)
     elif args.command == "commit":
-        handle_commit()
+        handlers.handle_commit()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,21 +1,49 @@
+import json
 import os
-import toml
 import logging
-from dataclasses import dataclass, field
-from typing import Optional, Any
-from dotenv import load_dotenv
+import re
+from dataclasses import dataclass, field, fields
+from typing import Any, ClassVar, Dict, Mapping, Optional, Tuple
 
-load_dotenv()
+
+# Directory holding the `cli` package, where the README tells users to put their `.env`
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load_dotenv():
+    """
+    Loads the `.env` files in the working directory and the project root, if they exist.
+    The working directory is loaded first, and neither file overrides a variable that is already set,
+    so its values win over the project root's and the environment wins over both.
+    Only these two locations are checked, so startup doesn't stat every directory up to the filesystem root.
+    """
+    paths = dict.fromkeys(os.path.join(directory, ".env") for directory in (os.getcwd(), _PROJECT_ROOT))
+    for path in paths:
+        if os.path.isfile(path):
+            from dotenv import load_dotenv
+
+            load_dotenv(path)
+
+
+_load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Flattened config files keyed by (path, mtime in ns), so an unchanged file is only parsed once per process
+_FILE_CACHE: Dict[Tuple[str, int], dict] = {}
+
+@dataclass(slots=True)
 class Config:
     """Configuration handler for the CLI tool."""
 
-    api_key: Optional[str] = field(default_factory=lambda: os.environ.get("GEMINI_API_KEY"))
-    google_api_key: Optional[str] = field(default_factory=lambda: os.environ.get("GOOGLE_API_KEY"))
-    search_engine_id: Optional[str] = field(default_factory=lambda: os.environ.get("PROGRAMMABLE_SEARCH_ENGINE_ID"))
+    # Environment consulted for every setting. It is the live os.environ rather than a copy: copying it costs
+    # more than the dozen lookups a Config makes, and a copy would miss changes made after import.
+    # Tests can replace it with a plain dict.
+    _env: ClassVar[Mapping[str, str]] = os.environ
+
+    api_key: Optional[str] = field(default_factory=lambda: Config._env.get("GEMINI_API_KEY"))
+    google_api_key: Optional[str] = field(default_factory=lambda: Config._env.get("GOOGLE_API_KEY"))
+    search_engine_id: Optional[str] = field(default_factory=lambda: Config._env.get("PROGRAMMABLE_SEARCH_ENGINE_ID"))
     model: str = "gemini-2.5-flash"
     interactive_mode: bool = False
     auto_execute: bool = False
@@ -23,29 +51,48 @@ class Config:
     custom_prompt: Optional[str] = None
     config_dir: str = field(default_factory=lambda: os.path.expanduser("~/.config/gemini-cli"))
     config_file: str = field(default_factory=lambda: os.path.join(os.path.expanduser("~/.config/gemini-cli"), "config.toml"))
-    _file_config: dict = field(init=False, repr=False)
+    _file_config: Optional[dict] = field(default=None, init=False, repr=False)
 
     # Application Configuration
     log_dir: str = field(init=False)
     history_file: str = field(init=False)
     max_history: int = field(init=False)
+    cache_dir: str = field(init=False)
+    cache_ttl: int = field(init=False)
+    cache_similarity_threshold: float = field(init=False)
+    max_parallel_requests: int = field(init=False)
+    speculative_correction: bool = field(init=False)
 
     def __post_init__(self):
         """Post-initialization to set up dependent fields."""
-        self._file_config = self._load_config_from_file()
         self.model = self._get_config("GEMINI_MODEL", self.model)
         self.log_dir = self._get_config("CLI_LOG_DIR", os.path.join(self.config_dir, "logs"))
         self.history_file = self._get_config("CLI_HISTORY_FILE", os.path.join(self.config_dir, "history.json"))
         self.max_history = int(self._get_config("CLI_MAX_HISTORY", 100))
+        self.cache_dir = self._get_config("CLI_CACHE_DIR", os.path.join(self.config_dir, "llm_cache"))
+        self.cache_ttl = int(self._get_config("CLI_CACHE_TTL", 86400))
+        self.cache_similarity_threshold = float(self._get_config("CLI_CACHE_SIMILARITY", 0.92))
+        self.max_parallel_requests = int(self._get_config("CLI_MAX_PARALLEL_REQUESTS", 8))
+        self.speculative_correction = str(self._get_config("CLI_SPECULATIVE_CORRECTION", False)).lower() in ("1", "true", "yes")
 
     def _load_config_from_file(self) -> dict:
-        """Loads configuration from the TOML file."""
+        """
+        Loads configuration from the TOML file, flattened to a single key -> value mapping across sections.
+        Only called once a value isn't set in the environment, and reuses the parsed file while it is unchanged.
+        """
         if not os.path.exists(self.config_file):
             self._create_default_config()
         try:
-            with open(self.config_file, 'r') as f:
-                return toml.load(f)
-        except (toml.TomlDecodeError, IOError) as e:
+            key = (self.config_file, os.stat(self.config_file).st_mtime_ns)
+            if key not in _FILE_CACHE:
+                flat: dict = {}
+                for section in _parse_toml(self.config_file).values():
+                    if isinstance(section, dict):
+                        for name, value in section.items():
+                            flat.setdefault(name, value)  # The first section defining a key wins
+                _FILE_CACHE[key] = flat
+            return _FILE_CACHE[key]
+        except (ValueError, IOError) as e:  # Both TOML parsers raise ValueError subclasses
             print(f"Warning: Could not read config file at {self.config_file}. Error: {e}")
             return {}
 
@@ -60,20 +107,25 @@ class Config:
             "application": {
                 "CLI_LOG_DIR": os.path.join(self.config_dir, "logs"),
                 "CLI_HISTORY_FILE": os.path.join(self.config_dir, "history.json"),
-                "CLI_MAX_HISTORY": 100
+                "CLI_MAX_HISTORY": 100,
+                "CLI_CACHE_DIR": os.path.join(self.config_dir, "llm_cache"),
+                "CLI_CACHE_TTL": 86400,
+                "CLI_CACHE_SIMILARITY": 0.92,
+                "CLI_MAX_PARALLEL_REQUESTS": 8
             },
             "behavior": {
                 "CLI_AUTO_EXECUTE": False,
                 "CLI_VERBOSE": False,
-                "CLI_INTERACTIVE_MODE": False
+                "CLI_INTERACTIVE_MODE": False,
+                "CLI_SPECULATIVE_CORRECTION": False
             },
             "customization": {
                 "CLI_CUSTOM_PROMPT": ""
             }
         }
         try:
-            with open(self.config_file, 'w') as f:
-                toml.dump(default_config, f)
+            with open(self.config_file, 'w', encoding='utf-8') as f:
+                f.write(_dump_toml(default_config))
             print(f"Created default config file at: {self.config_file}")
         except IOError as e:
             print(f"Error creating default config file: {e}")
@@ -84,17 +136,14 @@ class Config:
         then the config file, and finally a default value.
         """
         # 1. Check environment variable
-        value = os.environ.get(key)
+        value = self._env.get(key)
         if value is not None:
             return value
 
-        # 2. Check config file
-        for section in self._file_config.values():
-            if key in section:
-                return section[key]
-
-        # 3. Return default
-        return default
+        # 2. Check config file, 3. falling back to the default
+        if self._file_config is None:
+            self._file_config = self._load_config_from_file()
+        return self._file_config.get(key, default)
 
     def validate(self) -> bool:
         """Validate the configuration."""
@@ -111,13 +160,67 @@ class Config:
 
     def __str__(self) -> str:
         """Return string representation of the configuration."""
-        config_dict = self.__dict__.copy()
+        config_dict = {f.name: getattr(self, f.name) for f in fields(self)}
         if self.api_key:
             config_dict['api_key'] = f"{self.api_key[:4]}...{self.api_key[-4:]}" if len(self.api_key) > 8 else "****"
-        del config_dict['_file_config'] # Don't print the raw file contents
+        config_dict.pop('_file_config', None) # Don't print the raw file contents
         return str(config_dict)
 
 
+def _parse_toml(path: str) -> dict:
+    """Parses a TOML file with the standard library's tomllib, or its tomli backport before Python 3.11."""
+    try:
+        import tomllib
+    except ImportError:
+        import tomli as tomllib
+    with open(path, 'rb') as f:
+        return tomllib.load(f)
+
+
+# Keys TOML accepts without quotes.
+_BARE_KEY = re.compile(r"[A-Za-z0-9_-]+")
+
+
+def _toml_key(key: str) -> str:
+    """Renders a key bare when TOML allows it, quoted otherwise."""
+    return key if _BARE_KEY.fullmatch(key) else _toml_string(key)
+
+
+def _toml_string(value: str) -> str:
+    """
+    Renders a TOML basic string. JSON string escapes are valid in TOML, except that characters outside the BMP
+    would become surrogate pairs, so non-ASCII text is written as-is and only DEL, which TOML doesn't allow raw, is escaped.
+    """
+    return json.dumps(value, ensure_ascii=False).replace("\x7f", "\\u007f")
+
+
+def _dump_toml(config: Dict[str, dict], prefix: str = "") -> str:
+    """
+    Serializes a config of (possibly nested) tables holding strings, booleans and numbers to TOML.
+    That is all the default config needs, so no TOML writer dependency is required.
+    """
+    lines = []
+    for section, values in config.items():
+        name = f"{prefix}{_toml_key(section)}"
+        lines.append(f"[{name}]")
+        tables = {}
+        for key, value in values.items():
+            if isinstance(value, dict):
+                tables[key] = value  # Written after this table's own keys, which would otherwise belong to it
+                continue
+            if isinstance(value, bool):
+                rendered = "true" if value else "false"
+            elif isinstance(value, (int, float)):
+                rendered = repr(value)
+            else:
+                rendered = _toml_string(str(value))
+            lines.append(f"{_toml_key(key)} = {rendered}")
+        lines.append("")
+        if tables:
+            lines.append(_dump_toml(tables, prefix=f"{name}."))
+    return "\n".join(lines)
+
+
 # Singleton instance holder
 _config_instance: Optional[Config] = None
 
@@ -1,22 +1,57 @@
+import functools
 import logging
+import re
 import subprocess
 import shlex
 import platform
-from typing import Dict, List, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Optional, Union
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Programs that only read state, so running several of them at once cannot change their results.
+# Programs that can run other commands or set system state (env, date -s, hostname NAME) are left out.
+READ_ONLY_PROGRAMS = frozenset({
+    "cat", "df", "du", "echo", "file", "find", "free", "grep", "head",
+    "id", "ls", "lsblk", "pwd", "ps", "stat", "tail", "uname", "uptime", "wc", "which", "whoami",
+})
+
+# Arguments that make an otherwise read-only program write files or run commands.
+WRITING_ARGUMENTS = {
+    "find": frozenset({"-delete", "-exec", "-execdir", "-ok", "-okdir", "-fls", "-fprint", "-fprint0", "-fprintf"}),
+}
+
+# Shell syntax that introduces state or ordering between commands.
+SHELL_STATE_TOKENS = ("cd ", "export ", "source ", ". ", "$", ">", "<", "|", "&", ";", "`")
+
+# Characters that shlex treats specially; a command without any of them splits on whitespace alone.
+SHELL_METACHARACTERS = frozenset("\"'\\$`|&;<>()*?[]{}~#")
+# An argument between shlex's whitespace characters. str.split would also split on \v, \f and Unicode spaces.
+_PLAIN_ARGUMENT = re.compile(r"[^ \t\r\n]+")
+
+
+@functools.lru_cache(maxsize=128)
+def _split_command(command: str) -> Tuple[str, ...]:
+    """Splits a command line into arguments, reusing the result for commands that repeat."""
+    if SHELL_METACHARACTERS.isdisjoint(command):
+        return tuple(_PLAIN_ARGUMENT.findall(command))  # Same result as shlex.split without running its tokenizer
+    return tuple(shlex.split(command))
+
 
 class CommandExecutor:
     """Handles execution of shell commands."""
+
+    def __init__(self):
+        # The platform can't change while the process runs, so resolve it once rather than per command
+        self._is_windows = platform.system() == "Windows"
     
-    def execute_command(self, command: str) -> Tuple[bool, str, str]:
+    def execute_command(self, command: Union[str, List[str]]) -> Tuple[bool, str, str]:
         """
         Execute a single shell command.
         
         Args:
-            command: The shell command to execute
+            command: The shell command to execute, or its already split arguments
             
         Returns:
             Tuple of (success, stdout, stderr)
@@ -24,40 +59,25 @@ class CommandExecutor:
         logger.info(f"Executing command: {command}")
         
         try:
-            # Check if we're on Windows
-            is_windows = platform.system() == "Windows"
-            
-            if is_windows:
+            if isinstance(command, str) and self._is_windows:
                 # On Windows, use shell=True to execute commands
-                process = subprocess.Popen(
-                    command,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    shell=True
-                )
-            else:
+                args, shell = command, True
+            elif isinstance(command, str):
                 # On Unix-like systems, use shlex to properly handle command arguments
-                args = shlex.split(command)
-                
-                # Execute the command and capture output
-                process = subprocess.Popen(
-                    args,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
-            
-            stdout, stderr = process.communicate()
+                args, shell = list(_split_command(command)), False
+            else:
+                args, shell = list(command), False
+
+            process = subprocess.run(args, capture_output=True, text=True, shell=shell)
             success = process.returncode == 0
             
             if success:
                 logger.info(f"Command executed successfully: {command}")
             else:
                 logger.error(f"Command failed with return code {process.returncode}: {command}")
-                logger.error(f"stderr: {stderr}")
+                logger.error(f"stderr: {process.stderr}")
                 
-            return success, stdout, stderr
+            return success, process.stdout, process.stderr
             
         except Exception as e:
             logger.exception(f"Error executing command '{command}': {str(e)}")
@@ -91,6 +111,49 @@ class CommandExecutor:
                 
         return results
 
+    @staticmethod
+    def commands_are_parallel_safe(commands: List[str]) -> bool:
+        """
+        Whether the commands are independent of each other and can run concurrently.
+
+        This is deliberately conservative: every command must be a known read-only program
+        with no shell syntax that could carry state from one command to the next.
+        """
+        if len(commands) < 2:
+            return False
+        for command in commands:
+            if any(token in command for token in SHELL_STATE_TOKENS):
+                return False
+            try:
+                args = _split_command(command)
+            except ValueError:
+                return False
+            if not args or args[0] not in READ_ONLY_PROGRAMS:
+                return False
+            if not WRITING_ARGUMENTS.get(args[0], frozenset()).isdisjoint(args[1:]):
+                return False
+        return True
+
+    def execute_commands_parallel(self, commands: List[str]) -> List[Dict]:
+        """
+        Execute independent commands concurrently.
+
+        Unlike execute_commands, every command runs even if another one fails.
+
+        Args:
+            commands: List of shell commands to execute
+
+        Returns:
+            List of execution results, in the same order as the commands
+        """
+        with ThreadPoolExecutor(max_workers=len(commands)) as pool:
+            outcomes = list(pool.map(self.execute_command, commands))
+
+        return [
+            {"command": command, "success": success, "stdout": stdout, "stderr": stderr}
+            for command, (success, stdout, stderr) in zip(commands, outcomes)
+        ]
+
 
 # Create a global executor instance
 executor = CommandExecutor() 
\ No newline at end of file
@@ -1,3 +1,4 @@
+import os
 import subprocess
 from typing import Tuple
 
@@ -11,26 +12,26 @@ def get_staged_diff() -> Tuple[str or None, str or None]:
         If an error occurs, the diff string will be None.
     """
     try:
-        # Check if it's a git repository
-        subprocess.run(["git", "rev-parse", "--is-inside-work-tree"], check=True, capture_output=True)
-        
-        # Get the staged diff
+        # A single git call: outside a repository `git diff --staged` fails by itself, so no rev-parse pre-check.
+        # LC_ALL=C keeps its messages in English for the checks below, and GIT_OPTIONAL_LOCKS=0 stops this
+        # read-only query from refreshing the index on disk.
         result = subprocess.run(
             ["git", "diff", "--staged"],
             capture_output=True,
             text=True,
-            check=True
+            env={**os.environ, "GIT_OPTIONAL_LOCKS": "0", "LC_ALL": "C"},
         )
-        
-        if not result.stdout:
-            return "", "No staged changes found. Use 'git add' to stage your changes."
-            
-        return result.stdout, None
-        
     except FileNotFoundError:
         return None, "Git command not found. Please ensure Git is installed and in your PATH."
-    except subprocess.CalledProcessError as e:
-        error_message = e.stderr.strip()
-        if "not a git repository" in error_message:
+
+    if result.returncode != 0:
+        error_message = result.stderr.strip()
+        # Outside a repository git treats the call as `git diff --no-index` and rejects --staged with a usage error
+        if "not a git repository" in error_message.lower() or "--no-index" in error_message:
             return None, "This is not a Git repository."
-        return None, f"An error occurred while running git: {error_message}" 
\ No newline at end of file
+        return None, f"An error occurred while running git: {error_message}"
+
+    if not result.stdout:
+        return "", "No staged changes found. Use 'git add' to stage your changes."
+
+    return result.stdout, None
@@ -1,50 +1,141 @@
 from rich.console import Console
-from rich.markdown import Markdown
 from rich.panel import Panel
-from rich.syntax import Syntax
 
 from .parser import get_symbol_code
-from .api import GeminiClient
+from .jsonutil import StringArrayStream
 from .config import get_config
 from .git_utils import get_staged_diff
 import subprocess
 import difflib
+import functools
+import shutil
+import tempfile
 import os
-import ast
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional
 
 console = Console()
-config = get_config()
-api_key = config.api_key
-gemini_client = GeminiClient(api_key=api_key, model=config.model)
+
+# Combined size of both versions above which refactoring diffs are computed by git instead of difflib
+LARGE_DIFF_CHARS = 50_000
+DIFF_CONTEXT_LINES = 2
+
+# Directories never searched for files to audit: VCS metadata, bytecode caches and virtualenvs
+AUDIT_SKIPPED_DIRS = frozenset({".git", "__pycache__", ".venv"})
+
+
+def _client():
+    """Returns the shared Gemini client, importing the API layer only once a command needs it."""
+    from .api import get_client
+
+    return get_client()
+
 
 def _apply_refactoring(file_path: str, original_content: str, refactored_code: str, start_line: int, end_line: int) -> bool:
     """Replaces the old code block with the refactored code in the file."""
-    lines = original_content.splitlines(True) # Keep endings
-    
-    # Lines are 1-based, list indices are 0-based
-    start_index = start_line - 1
-    
-    # The end_line from the parser is inclusive, so no change needed for slicing
-    new_lines = lines[:start_index] + [refactored_code + '\n'] + lines[end_line:]
-    
+    # Character offset where each line starts; lines are 1-based and end_line is inclusive.
+    # A start_line of 0 means the whole file.
+    offsets = [0]
+    position = original_content.find('\n')
+    while position != -1 and len(offsets) <= end_line:
+        offsets.append(position + 1)
+        position = original_content.find('\n', position + 1)
+    start_offset = offsets[max(start_line - 1, 0)]
+    end_offset = offsets[end_line] if end_line < len(offsets) else len(original_content)
+
+    # Write to a temporary file next to the original and swap it in, so a failure never leaves a partial file
+    directory = os.path.dirname(os.path.abspath(file_path))
+    temp_path = None
     try:
-        with open(file_path, 'w') as f:
-            f.writelines(new_lines)
+        with tempfile.NamedTemporaryFile('w', dir=directory, delete=False) as f:
+            temp_path = f.name
+            f.write(original_content[:start_offset])
+            f.write(refactored_code + '\n')
+            f.write(original_content[end_offset:])
+        shutil.copymode(file_path, temp_path)
+        os.replace(temp_path, file_path)
         return True
     except IOError as e:
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
         console.print(f"[bold red]Error writing to file {file_path}: {e}[/bold red]")
         return False
 
+@functools.lru_cache(maxsize=64)
+def _cached_symbol_code(file_path: str, mtime_ns: int, size: int, symbol: Optional[str]):
+    return get_symbol_code(file_path, symbol)
+
+def _symbol_code(file_path: str, symbol: Optional[str]):
+    """
+    get_symbol_code, reusing the result while the file is unchanged, so running several commands on the
+    same file in one session reads and searches it once.
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None, None, None, None
+    return _cached_symbol_code(file_path, stat.st_mtime_ns, stat.st_size, symbol)
+
+def _clean_docstring(docstring: str) -> str:
+    """
+    Strips the string-literal wrapping the model sometimes puts around a docstring (outer quotes, possibly
+    nested, and escaped newlines, tabs and quotes). Text that isn't wrapped in quotes is only stripped of whitespace.
+    """
+    text = docstring.strip()
+    while True:
+        quote = next(
+            (q for q in ('"""', "'''", '"', "'")
+             if len(text) >= 2 * len(q) and text.startswith(q) and text.endswith(q)),
+            None,
+        )
+        if quote is None:
+            return text
+        text = text[len(quote):-len(quote)]
+        text = text.replace('\\n', '\n').replace('\\t', '\t').replace('\\"', '"').replace("\\'", "'").strip()
+
+def _unified_diff(original: str, refactored: str) -> str:
+    """
+    Returns a unified diff between two versions of some code.
+    Large inputs are diffed by git, whose native diff is far faster than difflib's quadratic worst case;
+    difflib is used for small inputs and whenever git isn't available.
+    """
+    if len(original) + len(refactored) > LARGE_DIFF_CHARS:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name, content in (("original", original), ("refactored", refactored)):
+                with open(os.path.join(tmp_dir, name), 'w') as f:
+                    f.write(content)
+            try:
+                result = subprocess.run(
+                    ["git", "--no-pager", "diff", "--no-index", "--no-prefix", f"-U{DIFF_CONTEXT_LINES}",
+                     "original", "refactored"],
+                    cwd=tmp_dir, capture_output=True, text=True,
+                )
+                if result.returncode in (0, 1):  # 1 means the files differ
+                    return result.stdout
+            except OSError:
+                pass
+
+    return "".join(difflib.unified_diff(
+        original.splitlines(keepends=True),
+        refactored.splitlines(keepends=True),
+        fromfile='original',
+        tofile='refactored',
+        n=DIFF_CONTEXT_LINES,
+    ))
+
 def handle_explain(file_path: str, symbol: str or None):
     """Handler for the 'explain' command."""
+    from rich.markdown import Markdown
+
     console.print(f"📄 Explaining '{symbol or file_path}'...")
     
-    code, file_content, _, _ = get_symbol_code(file_path, symbol)
+    code, file_content, _, _ = _symbol_code(file_path, symbol)
     if not code:
         console.print(f"[bold red]Error: Could not find '{symbol or file_path}'.[/bold red]")
         return
 
-    response = gemini_client.generate_explanation(code)
+    response = _client().generate_explanation(code)
     if "error" in response:
         console.print(f"[bold red]Error from API: {response['error']}[/bold red]")
     else:
@@ -54,30 +145,17 @@ def handle_doc(file_path: str, symbol: str or None):
     """Handler for the 'doc' command."""
     console.print(f"📝 Generating documentation for '{symbol or file_path}'...")
     
-    code, file_content, _, _ = get_symbol_code(file_path, symbol)
+    code, file_content, _, _ = _symbol_code(file_path, symbol)
     if not code:
         console.print(f"[bold red]Error: Could not find '{symbol or file_path}'.[/bold red]")
         return
         
-    response = gemini_client.generate_docstring(code)
+    response = _client().generate_docstring(code)
     if "error" in response:
         console.print(f"[bold red]Error from API: {response['error']}[/bold red]")
     else:
         docstring = response.get("docstring", "No docstring provided.")
-        try:
-            # The model sometimes returns a string literal including quotes and escaped newlines.
-            # ast.literal_eval will safely parse this into a normal string.
-            docstring_content = ast.literal_eval(docstring)
-            # Sometimes it might be double-encoded
-            if isinstance(docstring_content, str) and docstring_content.startswith('"""'):
-                 docstring_content = ast.literal_eval(docstring_content)
-        except (ValueError, SyntaxError):
-            # If it's not a string literal, use it as is.
-            docstring_content = docstring
-
-        # Finally, remove the outer triple quotes if they exist
-        if isinstance(docstring_content, str):
-            docstring_content = docstring_content.strip().strip('"""')
+        docstring_content = _clean_docstring(docstring)
 
         console.print(Panel(docstring_content, title="Generated Docstring", border_style="green"))
 
@@ -85,12 +163,12 @@ def handle_refactor(file_path: str, instruction: str, symbol: str or None):
     """Handler for the 'refactor' command."""
     console.print(f"🛠️ Refactoring '{symbol or file_path}'...")
 
-    original_code, file_content, start_line, end_line = get_symbol_code(file_path, symbol)
+    original_code, file_content, start_line, end_line = _symbol_code(file_path, symbol)
     if not original_code or file_content is None or start_line is None or end_line is None:
         console.print(f"[bold red]Error: Could not find '{symbol or file_path}'.[/bold red]")
         return
 
-    response = gemini_client.generate_refactor(original_code, instruction)
+    response = _client().generate_refactor(original_code, instruction)
     if "error" in response:
         console.print(f"[bold red]Error from API: {response['error']}[/bold red]")
         return
@@ -100,14 +178,8 @@ def handle_refactor(file_path: str, instruction: str, symbol: str or None):
         console.print("[bold yellow]The model did not return any code to refactor.[/bold yellow]")
         return
 
-    diff = difflib.unified_diff(
-        original_code.splitlines(keepends=True),
-        refactored_code.splitlines(keepends=True),
-        fromfile='original',
-        tofile='refactored',
-    )
     console.print("\n[bold]Diff:[/bold]")
-    console.print("".join(diff))
+    console.print(_unified_diff(original_code, refactored_code))
 
     if console.input("\n [bold yellow]Apply these changes? [y/n]:[/] ").lower() == "y":
         if _apply_refactoring(file_path, file_content, refactored_code, start_line, end_line):
@@ -120,12 +192,12 @@ def handle_test(file_path: str, symbol: str or None):
     """Handler for the 'test' command."""
     console.print(f"🧪 Generating tests for '{symbol or file_path}'...")
 
-    code, file_content, _, _ = get_symbol_code(file_path, symbol)
+    code, file_content, _, _ = _symbol_code(file_path, symbol)
     if not code:
         console.print(f"[bold red]Error: Could not find '{symbol or file_path}'.[/bold red]")
         return
 
-    response = gemini_client.generate_test(code)
+    response = _client().generate_test(code)
     if "error" in response:
         console.print(f"[bold red]Error from API: {response['error']}[/bold red]")
     else:
@@ -134,16 +206,18 @@ def handle_test(file_path: str, symbol: str or None):
 
 def handle_debug(file_path: str, error_message: str):
     """Handler for the 'debug' command."""
+    from rich.syntax import Syntax
+
     console.print(f"🐛 Debugging '{file_path}'...")
 
     # For debugging, we'll use the whole file's content.
     # In the future, we could try to intelligently find the symbol from the traceback.
-    code, _, _, _ = get_symbol_code(file_path, None)
+    code, _, _, _ = _symbol_code(file_path, None)
     if not code:
         console.print(f"[bold red]Error: Could not read file '{file_path}'.[/bold red]")
         return
 
-    response = gemini_client.generate_fix(code, error_message)
+    response = _client().generate_fix(code, error_message)
 
     if "error" in response:
         console.print(f"[bold red]Error from API: {response['error']}[/bold red]")
@@ -160,8 +234,17 @@ def handle_debug(file_path: str, error_message: str):
         console.print("[bold yellow]The model did not return a code fix.[/bold yellow]")
 
 
-def handle_audit(path: str):
-    """Handler for the 'audit' command."""
+def _audit_file(file_path: str) -> dict:
+    """Reads a file and requests its security audit report."""
+    with open(file_path, 'r') as f:
+        code = f.read()
+    return _client().generate_audit_report(code)
+
+def handle_audit(path: str, plain: bool = False):
+    """
+    Handler for the 'audit' command.
+    With `plain`, reports are written to stdout as raw Markdown, skipping Rich's layout of every report.
+    """
     if not os.path.exists(path):
         console.print(f"[bold red]Error: Path '{path}' not found.[/bold red]")
         return
@@ -173,10 +256,10 @@ def handle_audit(path: str):
         else:
             console.print(f"[bold yellow]Skipping non-Python file: {path}[/bold yellow]")
     elif os.path.isdir(path):
-        for root, _, files in os.walk(path):
-            for file in files:
-                if file.endswith(".py"):
-                    files_to_audit.append(os.path.join(root, file))
+        for root, dirs, files in os.walk(path):
+            # Pruning in place stops the walk from descending into these at all
+            dirs[:] = [d for d in dirs if d not in AUDIT_SKIPPED_DIRS]
+            files_to_audit.extend(os.path.join(root, file) for file in files if file.endswith(".py"))
 
     if not files_to_audit:
         console.print("[bold yellow]No Python files found to audit.[/bold yellow]")
@@ -184,29 +267,53 @@ def handle_audit(path: str):
 
     console.print(f"🛡️  Auditing {len(files_to_audit)} Python file(s)...")
 
-    for file_path in files_to_audit:
-        console.print(f"\n[bold]Auditing: {file_path}[/bold]")
-        with open(file_path, 'r') as f:
-            code = f.read()
+    # Each report is a separate API round-trip, so request them concurrently and show each as it arrives.
+    # Results are only printed from this thread, which keeps the console output in whole blocks.
+    max_workers = min(get_config().max_parallel_requests, len(files_to_audit))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_audit_file, file_path): file_path for file_path in files_to_audit}
+        for future in as_completed(futures):
+            file_path = futures[future]
+            console.print(f"\n[bold]Auditing: {file_path}[/bold]")
+            try:
+                response = future.result()
+            except OSError as e:
+                console.print(f"[bold red]  Error reading file: {e}[/bold red]")
+                continue
 
-        response = gemini_client.generate_audit_report(code)
+            if "error" in response:
+                console.print(f"[bold red]  Error from API: {response['error']}[/bold red]")
+                continue
 
-        if "error" in response:
-            console.print(f"[bold red]  Error from API: {response['error']}[/bold red]")
-            continue
+            summary = response.get("summary", "No summary provided.")
+            report = response.get("report", "No report provided.")
 
-        summary = response.get("summary", "No summary provided.")
-        report = response.get("report", "No report provided.")
+            console.print(f"[italic cyan]  Summary: {summary}[/italic cyan]")
+            if plain:
+                console.file.write(f"\n{report}\n")
+            else:
+                from rich.markdown import Markdown
 
-        console.print(f"[italic cyan]  Summary: {summary}[/italic cyan]")
-        console.print(Panel(Markdown(report), title="Security Audit Report", border_style="red"))
+                console.print(Panel(Markdown(report), title="Security Audit Report", border_style="red"))
 
 
 def handle_run(instruction: str):
     """Handler for the 'run' command."""
     console.print(f"🏃 Executing: '{instruction}'...")
 
-    response = gemini_client.generate_shell_command(instruction)
+    # Commands are shown as soon as each one has streamed in, while the explanation is still being generated.
+    # They only run once the whole response has arrived and parsed.
+    streamed = StringArrayStream("commands")
+    shown = []
+
+    def show_commands(chunk: str):
+        for cmd in streamed.feed(chunk):
+            if not shown:
+                console.print(f"\n[bold]Suggested Commands:[/bold]")
+            shown.append(cmd)
+            console.print(f"  > {cmd}")
+
+    response = _client().generate_shell_command(instruction, on_chunk=show_commands)
 
     if "error" in response:
         console.print(f"[bold red]Error from API: {response['error']}[/bold red]")
@@ -219,13 +326,16 @@ def handle_run(instruction: str):
         console.print("[bold yellow]The model did not return any commands to execute.[/bold yellow]")
         return
 
-    console.print(f"\n[bold]Suggested Commands:[/bold]")
-    for cmd in commands:
+    if commands[:len(shown)] != shown:
+        shown.clear()  # What streamed in doesn't match the parsed response, so show the parsed commands instead
+    if not shown:
+        console.print(f"\n[bold]Suggested Commands:[/bold]")
+    for cmd in commands[len(shown):]:
         console.print(f"  > {cmd}")
     console.print(f"\n[italic]Explanation: {explanation}[/italic]")
 
     # Check if we should execute without asking
-    if config.auto_execute or console.input("\n [bold yellow]Execute these commands? [y/n]:[/] ").lower() == 'y':
+    if get_config().auto_execute or console.input("\n [bold yellow]Execute these commands? [y/n]:[/] ").lower() == 'y':
         for cmd in commands:
             console.print(f"\n[bold cyan]$ {cmd}[/bold cyan]")
             try:
@@ -261,7 +371,7 @@ def start_interactive_mode():
             conversation_history.append({"role": "user", "content": user_input})
             
             # This will be properly implemented in the next step
-            response = gemini_client.generate_next_action(conversation_history, user_input)
+            response = _client().generate_next_action(conversation_history, user_input)
             
             # For now, just print the raw response
             console.print(f"[bold yellow]Agent:[/bold yellow] {response}")
@@ -275,8 +385,18 @@ def start_interactive_mode():
     console.print("\n[bold green]Exiting Interactive Mode. Goodbye![/bold green]")
 
 
+def handle_agent(speculative_correction: Optional[bool] = None):
+    """Handler for the 'agent' command. Without --speculative-correction, the config setting decides."""
+    from .agent import Agent
+
+    Agent(speculative_correction=speculative_correction).start_interactive_session()
+
+
 def handle_commit():
-    """Handler for the 'commit' command."""
+    """
+    Handler for the 'commit' command.
+    If git can't run or the commit fails, the CLI exits with a non-zero status.
+    """
     console.print("✍️ Generating commit message...")
     
     diff, error = get_staged_diff()
@@ -289,7 +409,7 @@ def handle_commit():
         console.print("[bold yellow]No staged changes to commit.[/bold yellow]")
         return
 
-    response = gemini_client.generate_commit_message(diff)
+    response = _client().generate_commit_message(diff)
     if "error" in response:
         console.print(f"[bold red]Error from API: {response['error']}[/bold red]")
     else:
@@ -298,9 +418,15 @@ def handle_commit():
         
         if console.input(" [bold yellow]Apply this commit message? [y/n]:[/] ").lower() == "y":
             try:
-                subprocess.run(["git", "commit", "-m", commit_message], check=True)
-                console.print("[bold green]✅ Commit successful![/bold green]")
-            except subprocess.CalledProcessError:
-                console.print("[bold red]Failed to apply commit.[/bold red]")
+                result = subprocess.run(["git", "commit", "-m", commit_message])
             except FileNotFoundError:
-                console.print("[bold red]Git command not found.[/bold red]") 
+                console.print("[bold red]Git command not found.[/bold red]")
+                sys.exit(127)
+            except OSError as e:
+                console.print(f"[bold red]Could not run git: {e}[/bold red]")
+                sys.exit(126)
+            if result.returncode != 0:
+                console.print("[bold red]Failed to apply commit.[/bold red]")
+                # Exit with git's status, through a normal shutdown so exit hooks and logging still run
+                sys.exit(result.returncode)
+            console.print("[bold green]✅ Commit successful![/bold green]") 
@@ -0,0 +1,192 @@
+"""
+JSON helpers used on the hot serialization paths.
+
+Uses orjson when it is installed and falls back to the standard library otherwise.
+Dataclass instances are serialized as objects and other values that are not JSON types with str(),
+in both cases.
+"""
+import dataclasses
+import json
+import re
+from json.decoder import scanstring
+from typing import Any, List, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can catch this either way.
+JSONDecodeError = json.JSONDecodeError
+
+
+def _default(obj: Any) -> Any:
+    """Fallback serializer for the standard library encoder, matching what orjson does natively."""
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    return str(obj)
+
+
+def dumps_bytes(obj: Any, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """Serializes an object to UTF-8 encoded JSON."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=str, option=option)
+    if indent:
+        return json.dumps(obj, indent=2, sort_keys=sort_keys, default=_default).encode("utf-8")
+    # Match orjson's compact output
+    return json.dumps(obj, separators=(",", ":"), sort_keys=sort_keys, default=_default).encode("utf-8")
+
+
+def dumps(obj: Any, indent: bool = False, sort_keys: bool = False) -> str:
+    """Serializes an object to a JSON string."""
+    return dumps_bytes(obj, indent=indent, sort_keys=sort_keys).decode("utf-8")
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Parses a JSON document from a string or bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_within_budget(obj: Any, budget: int = 30000) -> str:
+    """
+    Serializes an object as compact JSON of roughly at most `budget` characters.
+
+    Long strings and containers are shortened before serializing, keeping their beginning and noting how
+    much was left out, so an oversized input is never serialized in full. The limits are tightened until
+    the result fits.
+    """
+    if _fits(obj, budget):
+        raw = dumps(obj)
+        if len(raw) <= budget:  # _fits undercounts escapes, so confirm
+            return raw
+
+    max_items, max_chars = 50, 2000
+    while True:
+        raw = dumps(_shrink(obj, max_items, max_chars))
+        if len(raw) <= budget or (max_items == 1 and max_chars == 40):
+            return raw
+        max_items, max_chars = max(1, max_items // 2), max(40, max_chars // 2)
+
+
+def _fits(obj: Any, budget: int) -> bool:
+    """
+    Whether obj plausibly serializes to at most `budget` characters, estimated without serializing it.
+    The walk stops as soon as the estimate passes the budget, so an oversized input is only partly visited.
+    """
+    size = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            size += 2 + 2 * len(item)  # Braces, plus a colon and a comma per entry
+            if size > budget:
+                return False
+            for key, value in item.items():
+                size += len(str(key)) + 2
+                stack.append(value)
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            size += 2 + len(item)  # Brackets and commas
+            if size > budget:
+                return False
+            stack.extend(item)
+        elif isinstance(item, str):
+            size += len(item) + 2
+        else:
+            size += len(str(item))
+        if size > budget:
+            return False
+    return True
+
+
+def _shrink(obj: Any, max_items: int, max_chars: int) -> Any:
+    """Returns a copy of obj with strings cut to max_chars and containers cut to max_items entries."""
+    if isinstance(obj, dict):
+        items = list(obj.items())
+        shrunk = {str(key): _shrink(value, max_items, max_chars) for key, value in items[:max_items]}
+        if len(items) > max_items:
+            shrunk["..."] = f"{len(items) - max_items} more keys omitted"
+        return shrunk
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        items = list(obj)
+        shrunk = [_shrink(item, max_items, max_chars) for item in items[:max_items]]
+        if len(items) > max_items:
+            shrunk.append(f"... {len(items) - max_items} more items omitted")
+        return shrunk
+    if obj is None or isinstance(obj, (bool, int, float)):
+        return obj
+
+    text = obj if isinstance(obj, str) else str(obj)
+    if len(text) <= max_chars:
+        return text
+    half = max_chars // 2
+    return f"{text[:half]}...[{len(text) - 2 * half} characters omitted]...{text[-half:]}"
+
+
+class StringArrayStream:
+    """
+    Picks the items of a JSON array of strings, such as "commands", out of a document that is still streaming in.
+
+    Each call to `feed` returns the items completed by that chunk. Items are only reported once their closing
+    quote has arrived, so a partial string is never returned.
+    """
+
+    def __init__(self, field: str):
+        self._key = '"%s"' % field
+        self._field = re.compile(r'%s\s*:\s*\[' % re.escape(self._key))
+        self._field_prefix = re.compile(r'%s\s*(?::\s*)?\Z' % re.escape(self._key))
+        # Chunks not yet consumed. Text before the array, and items already reported, are dropped, so each
+        # chunk is scanned a bounded number of times instead of the whole response on every call.
+        self._chunks: List[str] = []
+        self._in_array = False
+        self._in_item = False
+        self.done = False
+
+    def feed(self, chunk: str) -> List[str]:
+        if self.done:
+            return []
+        self._chunks.append(chunk)
+        if self._in_item and '"' not in chunk:
+            return []  # Still inside a string that can only end at a quote
+        text = "".join(self._chunks)
+        self._chunks.clear()
+
+        pos = 0
+        if not self._in_array:
+            match = self._field.search(text)
+            if not match:
+                # Keep only what a match could still start in: a key that only whitespace or the colon follows
+                # so far, or otherwise the last few characters, which may hold the start of the key.
+                start = text.rfind(self._key)
+                if start == -1 or not self._field_prefix.match(text, start):
+                    start = max(len(text) - len(self._key) + 1, 0)
+                self._chunks.append(text[start:])
+                return []
+            self._in_array = True
+            pos = match.end()
+
+        items = []
+        self._in_item = False
+        while True:
+            while pos < len(text) and text[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(text):
+                break
+            if text[pos] != '"':
+                self.done = True  # End of the array, or an item that isn't a string
+                break
+            try:
+                item, pos = scanstring(text, pos + 1)
+            except JSONDecodeError:
+                self._in_item = True  # The string hasn't fully arrived yet
+                break
+            items.append(item)
+        if not self.done:
+            self._chunks.append(text[pos:])
+        return items
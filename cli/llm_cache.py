@@ -0,0 +1,249 @@
+import base64
+import hashlib
+import logging
+import math
+import os
+import tempfile
+import time
+from array import array
+from typing import Dict, List, Any, Optional
+
+from . import jsonutil
+from .config import get_config
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class LLMCache:
+    """A persistent, exact-match cache for model responses."""
+
+    def __init__(self, cache_dir: str, ttl: int = 86400):
+        """
+        Initializes the cache.
+
+        Args:
+            cache_dir: Directory where cached responses are stored, one JSON file per key.
+            ttl: Seconds a cached response stays valid. A value <= 0 disables the cache.
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self._memory: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def cache_key(model: str, history: List[Dict[str, Any]], instruction: str) -> str:
+        """Returns a deterministic SHA-256 key for a model, conversation history and instruction."""
+        payload = jsonutil.dumps_bytes(
+            {"model": model, "history": history, "instruction": instruction},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload).hexdigest()
+
+    @staticmethod
+    def prompt_key(model: str, prompt: str) -> str:
+        """Returns a deterministic SHA-256 key for a single-shot prompt sent to a model."""
+        return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the cached response for `key`, or None on a miss or an expired entry."""
+        if self.ttl <= 0:
+            return None
+
+        entry = self._memory.get(key)
+        if entry is None:
+            try:
+                with open(self._path(key), 'rb') as f:
+                    entry = jsonutil.loads(f.read())
+            except (OSError, jsonutil.JSONDecodeError):
+                return None
+
+        try:
+            expired = time.time() - entry["created"] > self.ttl
+            response = entry["response"]
+        except (KeyError, TypeError):
+            # Valid JSON that isn't an entry this cache wrote, e.g. from an older version; drop it as a miss
+            logger.warning(f"Discarding malformed cache entry {key}")
+            self.delete(key)
+            return None
+
+        if expired:
+            self.delete(key)
+            return None
+
+        self._memory[key] = entry
+        return response
+
+    def set(self, key: str, response: Dict[str, Any]):
+        """Stores a response under `key` in memory and on disk."""
+        if self.ttl <= 0:
+            return
+
+        entry = {"created": time.time(), "response": response}
+        self._memory[key] = entry
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self._path(key), 'wb') as f:
+                f.write(jsonutil.dumps_bytes(entry))
+        except (OSError, TypeError) as e:
+            logger.warning(f"Failed to persist cache entry {key}: {e}")
+
+    def delete(self, key: str):
+        """Removes a cached response."""
+        self._memory.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+
+class SemanticCache:
+    """
+    A similarity cache that reuses responses for paraphrased instructions.
+
+    Embeddings are L2-normalized when stored, so cosine similarity is a plain dot product.
+    Entries are only compared against others recorded with the same history signature,
+    so a response is never replayed into a different conversation context.
+
+    The index is a JSON Lines file that each insert appends one line to, with the vector packed as base64
+    float32, so an insert never rewrites the index and concurrent processes don't overwrite each other's entries.
+    Once it holds twice `max_entries` lines it is compacted by swapping in a rewritten copy.
+    """
+
+    def __init__(self, index_file: str, threshold: float = 0.92, max_entries: int = 500, ttl: int = 86400):
+        self.index_file = index_file
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: Optional[List[Dict[str, Any]]] = None
+        self._lines = 0
+
+    @staticmethod
+    def signature(history: List[Dict[str, Any]]) -> str:
+        """Returns a stable hash identifying a conversation history."""
+        return hashlib.sha256(jsonutil.dumps_bytes(history, sort_keys=True)).hexdigest()
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> List[float]:
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    @staticmethod
+    def _pack(vector: List[float]) -> str:
+        return base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+
+    @staticmethod
+    def _unpack(packed: str) -> List[float]:
+        vector = array("f")
+        vector.frombytes(base64.b64decode(packed))
+        return vector.tolist()
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry["created"] > self.ttl
+
+    def _load(self) -> List[Dict[str, Any]]:
+        if self._entries is None:
+            entries = []
+            try:
+                with open(self.index_file, 'rb') as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        self._lines += 1
+                        try:
+                            record = jsonutil.loads(line)
+                            entry = {
+                                "signature": record["signature"],
+                                "created": record["created"],
+                                "embedding": self._unpack(record["embedding"]),
+                                "response": record["response"],
+                            }
+                        except (jsonutil.JSONDecodeError, KeyError, TypeError, ValueError):
+                            continue  # A torn or foreign line; compaction drops it
+                        if not self._expired(entry):
+                            entries.append(entry)
+            except OSError:
+                pass
+            self._entries = entries[-self.max_entries:]
+        return self._entries
+
+    def has_entries(self, signature: str) -> bool:
+        """Whether any entry could match, so callers can skip computing an embedding."""
+        if self.ttl <= 0:
+            return False
+        return any(entry["signature"] == signature and not self._expired(entry) for entry in self._load())
+
+    def get(self, signature: str, embedding: List[float], threshold: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Returns the response of the most similar entry if it clears `threshold`, by default the cache's own."""
+        if self.ttl <= 0:
+            return None
+        threshold = self.threshold if threshold is None else threshold
+        query = self._normalize(embedding)
+        best_score, best_response = 0.0, None
+        for entry in self._load():
+            if entry["signature"] != signature or self._expired(entry):
+                continue
+            score = sum(a * b for a, b in zip(query, entry["embedding"]))
+            if score > best_score:
+                best_score, best_response = score, entry["response"]
+
+        if best_score >= threshold:
+            logger.info(f"Semantic cache hit (similarity={best_score:.3f}).")
+            return best_response
+        return None
+
+    def set(self, signature: str, embedding: List[float], response: Dict[str, Any]):
+        """Records a response, evicting the oldest entries beyond `max_entries`."""
+        if self.ttl <= 0:
+            return
+        entries = self._load()
+        entry = {"signature": signature, "created": time.time(), "embedding": self._normalize(embedding), "response": response}
+        try:
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            if self._lines >= 2 * self.max_entries:
+                # Re-read first, so entries other processes appended since the load survive the rewrite
+                self._entries, self._lines = None, 0
+                entries = self._load()
+                entries.append(entry)
+                del entries[:-self.max_entries]
+                self._compact(entries)
+                return
+            entries.append(entry)
+            del entries[:-self.max_entries]
+            # Led by a newline too, so a line left torn by a crashed writer can't swallow this one
+            line = b"\n" + jsonutil.dumps_bytes(dict(entry, embedding=self._pack(entry["embedding"]))) + b"\n"
+            # One write to an O_APPEND descriptor, so lines from concurrent processes don't interleave
+            fd = os.open(self.index_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+            self._lines += 1
+        except (OSError, TypeError) as e:
+            logger.warning(f"Failed to persist semantic cache: {e}")
+
+    def _compact(self, entries: List[Dict[str, Any]]):
+        """Rewrites the index with only the live entries, swapping it in so a crash never truncates it."""
+        temp_path = None
+        try:
+            with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(self.index_file), delete=False) as f:
+                temp_path = f.name
+                for entry in entries:
+                    f.write(jsonutil.dumps_bytes(dict(entry, embedding=self._pack(entry["embedding"]))) + b"\n")
+            os.replace(temp_path, self.index_file)
+            self._lines = len(entries)
+        except (OSError, TypeError):
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+# Create global cache instances
+llm_cache = LLMCache(cache_dir=get_config().cache_dir, ttl=get_config().cache_ttl)
+semantic_cache = SemanticCache(
+    index_file=os.path.join(get_config().cache_dir, "semantic_index.jsonl"),
+    threshold=get_config().cache_similarity_threshold,
+    ttl=get_config().cache_ttl,
+)
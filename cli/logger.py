@@ -1,21 +1,62 @@
-import json
+import atexit
+import functools
 import logging
 import os
+import queue
+import threading
 import time
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import IO, Dict, List, Any, Optional
 
-from rich.logging import RichHandler
-from rich.console import Console
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
+from . import jsonutil
 from .config import get_config
 
+logger = logging.getLogger(__name__)
+
+@functools.lru_cache(maxsize=None)
+def _ensure_dir(path: str):
+    """Creates a directory if needed, once per process for each path."""
+    os.makedirs(path, exist_ok=True)
+
+def _as_bytes(value: Any) -> bytes:
+    """Encodes captured command output for the history log, passing bytes through unchanged."""
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode("utf-8", "replace")
+
+def _tail_lines(path: str, count: Optional[int], block_size: int = 1 << 16) -> List[bytes]:
+    """
+    Returns the last `count` non-empty lines of a file, or all of them when count is None.
+    The file is read backwards in blocks, so only about as much of it as the requested lines take up is read.
+    """
+    with open(path, 'rb') as f:
+        if count is None:
+            return [line for line in f.read().splitlines() if line]
+        if count <= 0:
+            return []
+        end = f.seek(0, os.SEEK_END)
+        data = b""
+        while end > 0 and data.count(b"\n") <= count:
+            start = max(0, end - block_size)
+            f.seek(start)
+            data = f.read(end - start) + data
+            end = start
+    segments = data.split(b"\n")
+    if end > 0:
+        segments = segments[1:]  # The first segment may have been cut at the block boundary
+    lines = [line.rstrip(b"\r") for line in segments]
+    return [line for line in lines if line][-count:]
+
 def setup_logging():
     """Set up logging for the application."""
+    from rich.console import Console
+    from rich.logging import RichHandler
+
     config = get_config()
     # Ensure log directory exists
-    os.makedirs(config.log_dir, exist_ok=True)
+    _ensure_dir(config.log_dir)
     log_file = os.path.join(config.log_dir, "gemini-cli.log")
 
     # Root logger configuration
@@ -34,15 +75,20 @@ def setup_logging():
 
     # File handler (Rotating)
     file_handler = RotatingFileHandler(
-        log_file, maxBytes=10*1024*1024, backupCount=5  # 10 MB per file, 5 backups
+        log_file, maxBytes=10*1024*1024, backupCount=5,  # 10 MB per file, 5 backups
+        delay=True  # Don't open the file until the first record is written
     )
     file_handler.setLevel(logging.INFO)
     file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     file_handler.setFormatter(file_formatter)
 
-    # Add handlers to the root logger
-    root_logger.addHandler(rich_handler)
-    root_logger.addHandler(file_handler)
+    # The root logger only enqueues records; a background listener thread does the console and file I/O,
+    # so logging calls never block on a write or a rotation
+    log_queue = queue.SimpleQueue()
+    root_logger.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, rich_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)  # Drains the queue before exit
     
     # Configure specific loggers to be less verbose if needed
     logging.getLogger("urllib3").setLevel(logging.WARNING)
@@ -58,10 +104,21 @@ class CommandLogger:
     """
     A class to log shell command executions, including stdout and stderr.
     """
+    # Seconds between flushes of the shared command history file; it is also flushed when the process exits
+    FLUSH_INTERVAL = 5.0
+    # Size past which the execution log is rotated to commands.jsonl.1
+    EXECUTIONS_MAX_BYTES = 50 * 1024 * 1024
+
     def __init__(self):
         """Initialize the command logger."""
         self.log_dir = get_config().log_dir
-        os.makedirs(self.log_dir, exist_ok=True)
+        _ensure_dir(self.log_dir)
+        self._history_file: Optional[IO[bytes]] = None
+        self._history_lock = threading.Lock()
+        self._last_flush = 0.0
+        self.executions_path = os.path.join(self.log_dir, "commands.jsonl")
+        self._executions_file: Optional[IO[bytes]] = None
+        self._executions_lock = threading.Lock()
         
     def log_command(
         self, 
@@ -69,32 +126,49 @@ class CommandLogger:
         results: List[Dict[str, Any]]
     ):
         """Logs a command and its result to a file."""
-        log_file_path = os.path.join(self.log_dir, "command_history.log")
-        
+        # Built from encoded fragments so large outputs are encoded once and never copied into format strings
+        parts = [
+            b"--- Command Execution ---\nTimestamp: ", datetime.now().isoformat().encode(),
+            b"\nCommand: ", " && ".join(commands).encode("utf-8", "replace"), b"\n",
+        ]
+        for i, result in enumerate(results, 1):
+            parts += [
+                b"  --- Result %d ---\n  Success: %s\n  Return Code: %s\n" % (
+                    i, str(result['success']).encode(), str(result['return_code']).encode()),
+                b"  STDOUT:\n", _as_bytes(result['stdout']), b"\n",
+                b"  STDERR:\n", _as_bytes(result['stderr']), b"\n",
+            ]
+        parts.append(b"--- End ---\n\n")
+        record = b"".join(parts)
+
+        # The file stays open between calls and each record is a single write, so concurrent callers never interleave
         try:
-            with open(log_file_path, "a") as f:
-                f.write(f"--- Command Execution ---\\n")
-                f.write(f"Timestamp: {datetime.now().isoformat()}\\n")
-                f.write(f"Command: {' && '.join(commands)}\\n")
-                
-                for i, result in enumerate(results):
-                    f.write(f"  --- Result {i+1} ---\\n")
-                    f.write(f"  Success: {result['success']}\\n")
-                    f.write(f"  Return Code: {result['return_code']}\\n")
-                    f.write(f"  STDOUT:\\n{result['stdout']}\\n")
-                    f.write(f"  STDERR:\\n{result['stderr']}\\n")
-                
-                f.write("--- End ---\\n\\n")
+            with self._history_lock:
+                if self._history_file is None:
+                    log_file_path = os.path.join(self.log_dir, "command_history.log")
+                    self._history_file = open(log_file_path, "ab", buffering=1 << 16)
+                    atexit.register(self._close_history_file)
+                self._history_file.write(record)
+                now = time.monotonic()
+                if now - self._last_flush >= self.FLUSH_INTERVAL:
+                    self._history_file.flush()
+                    self._last_flush = now
         except IOError as e:
             logger.error(f"Failed to write to command log: {e}")
 
+    def _close_history_file(self):
+        with self._history_lock:
+            if self._history_file is not None:
+                self._history_file.close()
+                self._history_file = None
+
     def log_command_execution(self, 
                              user_instruction: str, 
                              commands: List[str], 
                              results: List[Dict], 
                              explanation: str) -> str:
         """
-        Log command execution details to a JSON file.
+        Log command execution details as one line of the JSON Lines execution log.
         
         Args:
             user_instruction: Original user instruction
@@ -105,9 +179,6 @@ class CommandLogger:
         Returns:
             Path to the log file
         """
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_file = os.path.join(self.log_dir, f"command_{timestamp}.json")
-        
         log_data = {
             "timestamp": int(time.time()),
             "datetime": datetime.now().isoformat(),
@@ -118,17 +189,26 @@ class CommandLogger:
         }
         
         try:
-            with open(log_file, 'w') as f:
-                json.dump(log_data, f, indent=2)
-            logger.info(f"Command execution logged to {log_file}")
-            return log_file
+            record = jsonutil.dumps_bytes(log_data) + b"\n"
+            with self._executions_lock:
+                if self._executions_file is not None and self._executions_file.tell() > self.EXECUTIONS_MAX_BYTES:
+                    self._executions_file.close()
+                    self._executions_file = None
+                    os.replace(self.executions_path, self.executions_path + ".1")
+                if self._executions_file is None:
+                    self._executions_file = open(self.executions_path, "ab", buffering=1 << 16)
+                    atexit.register(self._executions_file.close)
+                self._executions_file.write(record)
+                self._executions_file.flush()
+            logger.info(f"Command execution logged to {self.executions_path}")
+            return self.executions_path
         except Exception as e:
             logger.exception(f"Failed to log command execution: {str(e)}")
             return ""
     
     def get_command_history(self, limit: Optional[int] = None) -> List[Dict]:
         """
-        Get command execution history.
+        Get command execution history, newest first.
         
         Args:
             limit: Maximum number of history entries to return
@@ -139,29 +219,34 @@ class CommandLogger:
         history = []
         
         try:
-            # Get all log files
-            log_files = [os.path.join(self.log_dir, f) for f in os.listdir(self.log_dir) 
-                         if f.startswith("command_") and f.endswith(".json")]
-            
-            # Sort by modification time (newest first)
-            log_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-            
-            # Apply limit if specified
-            if limit is not None:
-                log_files = log_files[:limit]
-            
-            # Read each log file
-            for log_file in log_files:
+            # The current log holds the newest entries, the rotated one the entries before them
+            for path in (self.executions_path, self.executions_path + ".1"):
+                remaining = None if limit is None else limit - len(history)
                 try:
-                    with open(log_file, 'r') as f:
-                        history.append(json.load(f))
-                except Exception as e:
-                    logger.warning(f"Failed to read log file {log_file}: {str(e)}")
+                    lines = _tail_lines(path, remaining)
+                except FileNotFoundError:
+                    continue
+
+                for line in reversed(lines):
+                    if limit is not None and len(history) >= limit:
+                        return history
+                    try:
+                        history.append(jsonutil.loads(line))
+                    except jsonutil.JSONDecodeError as e:
+                        logger.warning(f"Skipping unreadable entry in {path}: {str(e)}")
             
             return history
         except Exception as e:
             logger.exception(f"Failed to get command history: {str(e)}")
             return []
 
-# Create a global logger instance
-command_logger = CommandLogger() 
\ No newline at end of file
+_command_logger: Optional[CommandLogger] = None
+
+def __getattr__(name: str):
+    """Creates the global `command_logger` instance on first access rather than at import."""
+    global _command_logger
+    if name == "command_logger":
+        if _command_logger is None:
+            _command_logger = CommandLogger()
+        return _command_logger
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}") 
\ No newline at end of file
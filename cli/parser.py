@@ -1,7 +1,23 @@
+import ast
+import functools
 import os
 import re
 from typing import Tuple, Optional
 
+@functools.lru_cache(maxsize=512)
+def _symbol_pattern(symbol: str) -> "re.Pattern[str]":
+    """
+    Compiles the pattern that finds the definition of `symbol`, once per symbol.
+
+    This regex is more robust and handles nested code blocks better by not relying on indentation.
+    It looks for `def` or `class` and captures everything until the next line that
+    starts at the same indentation level (or less), indicating the end of the block.
+    """
+    return re.compile(
+        r"^(?P<indentation>\s*)(?:def|class)\s+" + re.escape(symbol) + r"[\s(:]?.*?:\n(?P<body>(?:(?:\n|(?P=indentation)\s+.*))+)",
+        re.MULTILINE
+    )
+
 def get_symbol_code(file_path: str, symbol: Optional[str]) -> Tuple[Optional[str], Optional[str], Optional[int], Optional[int]]:
     """
     Extracts the code for a specific symbol (function or class) from a file,
@@ -22,17 +38,29 @@ def get_symbol_code(file_path: str, symbol: Optional[str]) -> Tuple[Optional[str
         content = f.read()
 
     if not symbol:
-        return content, content, 0, len(content.splitlines())
+        # Count lines without building a list of them; a final line without a newline still counts
+        line_count = content.count('\n') + (1 if content and not content.endswith('\n') else 0)
+        return content, content, 0, line_count
 
-    # This regex is more robust and handles nested code blocks better by not relying on indentation.
-    # It looks for `def` or `class` and captures everything until the next line that
-    # starts at the same indentation level (or less), indicating the end of the block.
-    pattern = re.compile(
-        r"^(?P<indentation>\s*)(?:def|class)\s+" + re.escape(symbol) + r"[\s(:]?.*?:\n(?P<body>(?:(?:\n|(?P=indentation)\s+.*))+)",
-        re.MULTILINE
-    )
-    
-    match = pattern.search(content)
+    # Python sources are searched through their syntax tree, which gives exact line ranges in linear time.
+    # The regex is only a fallback for files that don't parse, such as other languages.
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        tree = None
+    if tree is not None:
+        nodes = [
+            node for node in ast.walk(tree)
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and node.name == symbol
+        ]
+        if not nodes:
+            return None, content, None, None
+        node = min(nodes, key=lambda n: n.lineno)  # The first definition in the file, as the regex would find
+        start_line, end_line = node.lineno, node.end_lineno
+        lines = content.split('\n')
+        return '\n'.join(lines[start_line - 1:end_line]).strip(), content, start_line, end_line
+
+    match = _symbol_pattern(symbol).search(content)
 
     if match:
         code_block = match.group(0)
@@ -1,11 +1,8 @@
 import os
-import json
 from typing import Dict, Any, List
 
-# To get the config, we need to add the parent directory to the path
-import sys
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from cli.config import get_config
+from . import jsonutil
+from .config import get_config
 
 class SecurityManager:
     """Handles security policies and vets agent actions."""
@@ -15,16 +12,22 @@ class SecurityManager:
         self.config = get_config()
         self.profile_path = os.path.join(self.config.config_dir, "profile.json")
         self.security_policy = self._load_security_policy()
+        self._compile_policy()
+
+    def _compile_policy(self):
+        """Precomputes the lookup structures used on every check from the loaded policy."""
+        self._command_blacklist = frozenset(cmd.casefold() for cmd in self.security_policy.get("command_blacklist", []))
+        self._blocked_paths = tuple(os.path.abspath(path) for path in self.security_policy.get("file_access_blacklist", []))
 
     def _load_security_policy(self) -> Dict[str, Any]:
         """Loads the security policy from the user's profile."""
         try:
             if os.path.exists(self.profile_path):
-                with open(self.profile_path, 'r') as f:
-                    profile = json.load(f)
+                with open(self.profile_path, 'rb') as f:
+                    profile = jsonutil.loads(f.read())
                     return profile.get("security", self._get_default_policy())
             return self._get_default_policy()
-        except (json.JSONDecodeError, IOError):
+        except (jsonutil.JSONDecodeError, IOError):
             return self._get_default_policy()
 
     def _get_default_policy(self) -> Dict[str, Any]:
@@ -63,9 +66,8 @@ class SecurityManager:
                 command = cmd_parts[0]
                 
                 # Check command blacklist
-                for blacklisted in self.security_policy.get("command_blacklist", []):
-                    if command.lower() == blacklisted.lower():
-                        return False, f"Command '{command}' is blacklisted by the security policy."
+                if command.casefold() in self._command_blacklist:
+                    return False, f"Command '{command}' is blacklisted by the security policy."
 
         elif action_type == 'tool':
             if not self.security_policy.get('allow_tool_usage', False):
@@ -77,9 +79,8 @@ class SecurityManager:
             # Check for risky file access in tools
             if tool_name in ["read_file", "write_file", "monitor_file"]:
                 file_path = tool_args.get("file_path", "")
-                for blacklisted in self.security_policy.get("file_access_blacklist", []):
-                    if os.path.abspath(file_path).startswith(os.path.abspath(blacklisted)):
-                        return False, f"Access to '{file_path}' is restricted by the security policy."
+                if os.path.abspath(file_path).startswith(self._blocked_paths):
+                    return False, f"Access to '{file_path}' is restricted by the security policy."
         
         return True, "Action is allowed."
 
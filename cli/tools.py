@@ -1,17 +1,33 @@
+import atexit
 import platform
 import subprocess
 import os
 import sys
+import time
+import fnmatch
+import functools
 import glob
-from typing import Dict, Any
+import itertools
+import shutil
+import tempfile
+from typing import Dict, Any, Iterator, List, Optional
 import psutil
-import requests
-from bs4 import BeautifulSoup
-from googleapiclient.discovery import build
+from concurrent.futures import ThreadPoolExecutor
 from .config import get_config
 
 config = get_config()
 
+# Threads find_files uses to walk separate subtrees, so slow directory reads overlap
+FIND_FILES_MAX_WORKERS = min(8, os.cpu_count() or 1)
+# Most of a page web_scrape downloads before parsing
+WEB_SCRAPE_MAX_BYTES = 5 * 1024 * 1024
+WEB_SCRAPE_CHUNK_BYTES = 64 * 1024
+# psutil reports CPU usage since its previous sample, so take one at import and read against it later
+# instead of sleeping through a sampling interval on every call.
+CPU_SAMPLE_MIN_INTERVAL = 0.1
+psutil.cpu_percent(interval=None)
+_cpu_sampled_at = time.monotonic()
+
 def list_files(path: str = ".") -> Dict[str, Any]:
     """Lists files and directories at a given path."""
     if not os.path.isdir(path):
@@ -30,16 +46,20 @@ def read_file(file_path: str, start_line: int = 1, end_line: int = -1) -> Dict[s
     if not os.path.isfile(file_path):
         return {"success": False, "error": f"File not found: {file_path}"}
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            lines = f.readlines()
-        
-        if start_line > len(lines):
-            return {"success": False, "error": "Start line is beyond the end of the file."}
+        start_line = max(start_line, 1)
+        # Stream to the requested lines so only they are held in memory, however large the file is
+        with open(file_path, 'r', encoding='utf-8', errors='ignore', buffering=1 << 20) as f:
+            skipped = sum(1 for _ in itertools.islice(f, start_line - 1))
+            first_line = f.readline()
+            if skipped < start_line - 1 or not first_line:
+                return {"success": False, "error": "Start line is beyond the end of the file."}
+            if end_line != -1 and end_line < start_line:
+                return {"success": True, "content": ""}
 
-        start_index = start_line - 1
-        end_index = len(lines) if end_line == -1 or end_line > len(lines) else end_line
-        
-        return {"success": True, "content": "".join(lines[start_index:end_index])}
+            if end_line == -1:
+                # The rest of the file is wanted, and one bulk read decodes it several times faster than by lines
+                return {"success": True, "content": first_line + f.read()}
+            return {"success": True, "content": first_line + "".join(itertools.islice(f, end_line - start_line))}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
@@ -48,16 +68,45 @@ def write_file(file_path: str, content: str) -> Dict[str, Any]:
     Writes content to a specified file. Overwrites the file if it exists.
     Creates the directory if it doesn't exist.
     """
+    temp_path = None
     try:
         dir_name = os.path.dirname(file_path)
         if dir_name:
             os.makedirs(dir_name, exist_ok=True)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        target = os.path.realpath(file_path)
+        # Write an existing file next to itself and swap it in, so a failure never leaves it half-written.
+        # New files, and files whose directory isn't writable, are written in place.
+        if os.path.exists(target) and os.access(os.path.dirname(target), os.W_OK):
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=os.path.dirname(target), delete=False) as f:
+                temp_path = f.name
+                f.write(content)
+            shutil.copymode(target, temp_path)
+            os.replace(temp_path, target)
+        else:
+            with open(target, 'w', encoding='utf-8') as f:
+                f.write(content)
         return {"success": True, "message": f"File '{file_path}' written successfully."}
     except Exception as e:
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
         return {"success": False, "error": str(e)}
 
+PACKAGE_MANAGERS = {
+    "apt-get": "/usr/bin/apt-get",
+    "yum": "/usr/bin/yum",
+    "dnf": "/usr/bin/dnf",
+    "pacman": "/usr/bin/pacman",
+}
+
+@functools.lru_cache(maxsize=None)
+def _find_package_manager() -> Optional[str]:
+    """Returns the first installed package manager. Looked up once, since it doesn't change within a session."""
+    return next((manager for manager, path in PACKAGE_MANAGERS.items() if os.path.exists(path)), None)
+
+@functools.lru_cache(maxsize=None)
+def _has_journalctl() -> bool:
+    return os.path.exists("/usr/bin/journalctl")
+
 def install_package(package_name: str) -> Dict[str, Any]:
     """
     Installs a system package using apt, yum, or pacman on Linux.
@@ -66,19 +115,7 @@ def install_package(package_name: str) -> Dict[str, Any]:
     if sys.platform != "linux":
         return {"success": False, "error": "This tool is only available on Linux."}
 
-    managers = {
-        "apt-get": "/usr/bin/apt-get",
-        "yum": "/usr/bin/yum",
-        "dnf": "/usr/bin/dnf",
-        "pacman": "/usr/bin/pacman",
-    }
-    
-    manager_to_use = None
-    for manager, path in managers.items():
-        if os.path.exists(path):
-            manager_to_use = manager
-            break
-
+    manager_to_use = _find_package_manager()
     if not manager_to_use:
         return {"success": False, "error": "Could not find a supported package manager (apt, yum, dnf, pacman)."}
 
@@ -101,11 +138,69 @@ def find_files(pattern: str, path: str = ".") -> Dict[str, Any]:
     if not os.path.isdir(path):
         return {"success": False, "error": f"Directory not found: {path}"}
     try:
-        results = glob.glob(os.path.join(path, f"**/{pattern}"), recursive=True)
+        if os.sep in pattern or (os.altsep and os.altsep in pattern):
+            # Patterns spanning directories need glob's per-component matching
+            results = glob.glob(os.path.join(path, f"**/{pattern}"), recursive=True)
+        elif FIND_FILES_MAX_WORKERS > 1:
+            results = _find_in_subtrees(path, pattern)
+        else:
+            results = list(_iter_matching_paths(path, pattern))
         return {"success": True, "files": results}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+def _find_in_subtrees(path: str, pattern: str) -> List[str]:
+    """
+    Same results as `_iter_matching_paths`, but each top-level subdirectory is walked in its own thread.
+    Splitting only at the top level keeps the fan-out bounded and the per-task overhead small.
+    """
+    results = list(_iter_matching_paths(path, pattern, recurse=False))
+    try:
+        with os.scandir(path) as entries:
+            subdirs = [entry.path for entry in entries
+                       if not entry.name.startswith('.') and entry.is_dir(follow_symlinks=False)]
+    except OSError:
+        return results
+    if not subdirs:
+        return results
+
+    with ThreadPoolExecutor(max_workers=min(FIND_FILES_MAX_WORKERS, len(subdirs))) as pool:
+        for matches in pool.map(lambda subdir: list(_iter_matching_paths(subdir, pattern)), subdirs):
+            results.extend(matches)
+    return results
+
+def _iter_matching_paths(path: str, pattern: str, recurse: bool = True) -> Iterator[str]:
+    """
+    Yields the paths under `path` whose name matches `pattern`, as they are found.
+    Follows glob's rules for `**/pattern`: hidden directories are never descended into and hidden names only match
+    a pattern starting with a dot. Unlike glob, symlinked directories are not followed, so a link cycle can't recurse.
+    """
+    match_hidden = pattern.startswith('.')
+    try:
+        with os.scandir(path) as entries:
+            subdirs = []
+            for entry in entries:
+                hidden = entry.name.startswith('.')
+                if (match_hidden or not hidden) and fnmatch.fnmatch(entry.name, pattern):
+                    yield entry.path
+                if recurse and not hidden and entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+    except OSError:
+        return
+    for subdir in subdirs:
+        yield from _iter_matching_paths(subdir, pattern)
+
+def _cpu_percent() -> float:
+    """System-wide CPU usage since the previous sample, waiting out the rest of a short interval if needed."""
+    global _cpu_sampled_at
+    elapsed = time.monotonic() - _cpu_sampled_at
+    if elapsed < CPU_SAMPLE_MIN_INTERVAL:
+        # Too short a window gives a meaningless percentage
+        time.sleep(CPU_SAMPLE_MIN_INTERVAL - elapsed)
+    percent = psutil.cpu_percent(interval=None)
+    _cpu_sampled_at = time.monotonic()
+    return percent
+
 def get_system_info() -> Dict[str, Any]:
     """Retrieves basic Linux system information (OS, CPU, Memory)."""
     if sys.platform != "linux":
@@ -120,31 +215,59 @@ def get_system_info() -> Dict[str, Any]:
             "platform_release": platform.release(),
             "distro": distro_info.get('PRETTY_NAME', 'N/A'),
             "architecture": platform.machine(),
-            "cpu_usage_percent": psutil.cpu_percent(interval=1),
+            "cpu_usage_percent": _cpu_percent(),
             "memory_usage_percent": psutil.virtual_memory().percent,
         }
         return {"success": True, "info": info}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+@functools.lru_cache(maxsize=1)
+def _custom_search_service(api_key: str):
+    """Builds the Custom Search client once per key, so later searches reuse it and its HTTP connection."""
+    # Imported here because the discovery client is slow to import and only web search needs it.
+    from googleapiclient.discovery import build
+    return build("customsearch", "v1", developerKey=api_key, cache_discovery=False)
+
 def web_search(query: str) -> Dict[str, Any]:
     """Performs a web search using the configured Google Custom Search Engine."""
     if not config.google_api_key or not config.search_engine_id:
         return {"success": False, "error": "Web search tool not configured. Missing GOOGLE_API_KEY or PROGRAMMABLE_SEARCH_ENGINE_ID in .env file."}
     try:
-        service = build("customsearch", "v1", developerKey=config.google_api_key)
+        service = _custom_search_service(config.google_api_key)
         res = service.cse().list(q=query, cx=config.search_engine_id, num=5).execute()
         return {"success": True, "results": res.get('items', [])}
     except Exception as e:
         return {"success": False, "error": f"An error occurred during web search: {e}"}
 
+@functools.lru_cache(maxsize=1)
+def _http_session():
+    """
+    Returns the session web_scrape fetches with. Sharing it keeps connections alive between requests,
+    so repeated scrapes of the same host skip the TCP and TLS handshakes.
+    """
+    import requests
+    session = requests.Session()
+    session.headers['User-Agent'] = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    atexit.register(session.close)
+    return session
+
 def web_scrape(url: str) -> Dict[str, Any]:
     """Scrapes the text content of a given URL."""
+    # Imported here because requests and BeautifulSoup add noticeably to CLI start-up and only scraping needs them.
+    import requests
+    from bs4 import BeautifulSoup, FeatureNotFound
     try:
-        headers = {'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+        with _http_session().get(url, timeout=10, stream=True) as response:
+            response.raise_for_status()
+            # Only the start of the text is returned, so there is no need to download an unbounded page
+            chunks = response.iter_content(chunk_size=WEB_SCRAPE_CHUNK_BYTES)
+            body = b"".join(itertools.islice(chunks, WEB_SCRAPE_MAX_BYTES // WEB_SCRAPE_CHUNK_BYTES))
+        # Parsing bytes lets BeautifulSoup detect the encoding from the document itself
+        try:
+            soup = BeautifulSoup(body, 'lxml')
+        except FeatureNotFound:
+            soup = BeautifulSoup(body, 'html.parser')
         clean_text = soup.get_text(separator='\n', strip=True)[:4000]
         return {"success": True, "title": soup.title.string if soup.title else "No title found", "text": clean_text}
     except requests.exceptions.RequestException as e:
@@ -160,7 +283,7 @@ def read_system_logs(log_count: int = 20, service_filter: str = "") -> Dict[str,
     if sys.platform != "linux":
         return {"success": False, "error": "This tool is only available on Linux."}
 
-    if not os.path.exists("/usr/bin/journalctl"):
+    if not _has_journalctl():
         return {"success": False, "error": "journalctl is not available on this system."}
 
     try:
@@ -1,13 +1,36 @@
-from typing import List, Dict, Any, Optional
+import os
+import sys
+from typing import List, Dict, Any, Optional, Union
 
-from rich.console import Console
+from rich.console import Console, Group
 from rich.panel import Panel
-from rich.prompt import Confirm, Prompt
-from rich.table import Table
 from rich.text import Text
+# rich.table and rich.prompt are imported by the functions that use them, since most runs need neither
 
 console = Console()
 
+# Scripted and CI runs (or OWL_PLAIN=1) get plain text instead of panels and tables,
+# which skips rich's layout and rendering work on every print.
+PLAIN = not sys.stdout.isatty() or os.getenv("OWL_PLAIN") == "1"
+
+# History success markers, indexed by the success flag
+_SUCCESS_MARKS = ("[red]✗", "[green]✓")
+
+
+def _plain_text(content: Union[str, Text]) -> str:
+    """Strips rich markup from a string, or returns the plain text of a Text."""
+    return content.plain if isinstance(content, Text) else Text.from_markup(content).plain
+
+
+def show_panel(content: Union[str, Text], title: str = "", **panel_kwargs) -> None:
+    """Prints content in a panel, or as a title line followed by the content in plain mode."""
+    if PLAIN:
+        if title:
+            print(f"== {_plain_text(title)} ==")
+        print(_plain_text(content))
+        return
+    console.print(Panel(content, title=title, **panel_kwargs))
+
 
 def display_plan(response: Dict[str, Any]):
     """Displays the generated plan from the AI."""
@@ -21,15 +44,19 @@ def display_plan(response: Dict[str, Any]):
     if thought:
         console.print(Panel(Text(thought, justify="left"), title="[bold yellow]Thought Process[/bold yellow]", border_style="yellow"))
 
-    plan_panel = []
-    for i, step in enumerate(plan, 1):
-        plan_panel.append(f"[cyan]{i}.[/cyan] {step}")
-    
-    console.print(Panel("\\n".join(plan_panel), title="[bold green]Execution Plan[/bold green]", border_style="green"))
+    steps = "\n".join(f"[cyan]{i}.[/cyan] {step}" for i, step in enumerate(plan, 1))
+    console.print(Panel(steps, title="[bold green]Execution Plan[/bold green]", border_style="green"))
 
 
 def display_commands(commands: List[str], explanation: str) -> None:
     """Display commands and explanation in a rich format."""
+    if PLAIN:
+        print("\n".join(f"$ {command}" for command in commands))
+        show_panel(explanation, title="Explanation")
+        return
+
+    from rich.table import Table
+
     table = Table(title="Generated Commands")
     table.add_column("Command", style="cyan")
     
@@ -42,11 +69,14 @@ def display_commands(commands: List[str], explanation: str) -> None:
 
 def confirm_execution() -> bool:
     """Ask user to confirm command execution."""
+    from rich.prompt import Confirm
+
     return Confirm.ask("Execute these commands?")
 
 
 def display_results(results: List[dict]) -> None:
     """Display command execution results."""
+    panels = []
     for result in results:
         command = result["command"]
         success = result["success"]
@@ -57,13 +87,22 @@ def display_results(results: List[dict]) -> None:
         content = stdout if stdout else "No output"
         
         if stderr:
-            content = f"{content}\\n\\n[bold red]Error:[/bold red]\\n{stderr}" if content != "No output" else f"[bold red]Error:[/bold red]\\n{stderr}"
+            content = f"{content}\n\n[bold red]Error:[/bold red]\n{stderr}" if content != "No output" else f"[bold red]Error:[/bold red]\n{stderr}"
             
-        console.print(Panel(content, title=title, border_style="green" if success else "red"))
+        if PLAIN:
+            show_panel(content, title=title)
+        else:
+            panels.append(Panel(content, title=title, border_style="green" if success else "red"))
+
+    # One print writes every result to the terminal at once instead of once per command
+    if panels:
+        console.print(Group(*panels))
 
 
 def display_history(history: List[Dict[str, Any]]) -> None:
     """Display command execution history."""
+    from rich.table import Table
+
     if not history:
         console.print("[yellow]No command history found.[/yellow]")
         return
@@ -75,16 +114,15 @@ def display_history(history: List[Dict[str, Any]]) -> None:
     table.add_column("Success", style="magenta")
     
     for entry in history:
-        datetime_str = entry.get("datetime", "Unknown")
-        if isinstance(datetime_str, str) and len(datetime_str) > 19:
-            datetime_str = datetime_str[:19].replace("T", " ")
+        # Keep the date and time to the second, e.g. "2024-01-01 12:00:00"
+        datetime_str = str(entry.get("datetime", "Unknown"))[:19].replace("T", " ", 1)
         
         commands = entry.get("commands", [])
-        commands_str = "\\n".join(commands)
+        commands_str = "\n".join(commands)
         
         results = entry.get("results", [])
-        success = all(result.get("success", False) for result in results) if results else False
-        success_str = "[green]✓" if success else "[red]✗"
+        success = bool(results) and all(result.get("success") for result in results)
+        success_str = _SUCCESS_MARKS[success]
         
         table.add_row(
             datetime_str,
@@ -98,6 +136,8 @@ def display_history(history: List[Dict[str, Any]]) -> None:
 
 def display_home_page(console: Console):
     """Displays the interactive home page for the AI Coding Assistant."""
+    from rich.table import Table
+
     console.print(Panel(
         Text("Gemini CLI - Your AI Coding Assistant", justify="center"),
         title="✨ Welcome ✨",
@@ -153,6 +193,8 @@ def display_home_page(console: Console):
 
 def display_generated_commands(console: Console, commands: list, explanation: str):
     """Displays the commands generated by the AI."""
+    from rich.table import Table
+
     table = Table(title="Generated Commands", show_header=True, header_style="bold magenta")
     table.add_column("Command")
     for cmd in commands:
@@ -20,11 +20,11 @@ setup(
         "Environment :: Console",
         "Topic :: Utilities",
     ],
-    python_requires=">=3.7",
+    python_requires=">=3.10",
     install_requires=[
         "google-generativeai>=0.3.0",
         "rich>=12.0.0",
-        "toml>=0.10.2",
+        "tomli; python_version < '3.11'",
     ],
     entry_points={
         "console_scripts": [
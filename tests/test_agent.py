@@ -0,0 +1,101 @@
+import io
+import subprocess
+import sys
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from cli.agent import Agent, _parse_security_events
+
+
+EVENT_XML = """<Event xmlns='http://schemas.microsoft.com/win/2004/08/events/event'><System><EventID>{event_id}</EventID><Level>2</Level><TimeCreated SystemTime='2024-01-01T00:00:00Z'/></System><EventData><Data>{padding}</Data></EventData><RenderingInfo><Message> Message {event_id} </Message></RenderingInfo></Event>"""
+
+
+class TestParseSecurityEvents(unittest.TestCase):
+    """Test cases for parsing wevtutil output."""
+
+    def test_parses_concatenated_events(self):
+        """Test that root-less event elements are parsed into compact records."""
+        output = "\r\n".join(EVENT_XML.format(event_id=i, padding="x" * 5000) for i in (4625, 4740))
+
+        events = _parse_security_events(io.StringIO(output))
+
+        self.assertEqual(len(events), 2)
+        self.assertEqual(events[0], {
+            "EventID": "4625", "Level": "2", "TimeCreated": "2024-01-01T00:00:00Z", "Message": "Message 4625"
+        })
+        self.assertEqual(events[1]["EventID"], "4740")
+
+    def test_truncated_output_keeps_complete_events(self):
+        """Test that output cut off mid-event still yields the events before it."""
+        output = EVENT_XML.format(event_id=4625, padding="") + EVENT_XML.format(event_id=4740, padding="")[:60]
+
+        events = _parse_security_events(io.StringIO(output))
+
+        self.assertEqual([e["EventID"] for e in events], ["4625"])
+
+
+    def test_heavy_stderr_does_not_stall_query(self):
+        """Test that wevtutil filling its stderr pipe before writing events doesn't block until the timeout."""
+        script = (
+            "import sys; sys.stderr.write('w' * 1_000_000); sys.stderr.flush(); "
+            f"sys.stdout.write({EVENT_XML.format(event_id=4625, padding='')!r})"
+        )
+        popen = subprocess.Popen
+
+        def fake_wevtutil(command, **kwargs):
+            kwargs.pop("creationflags", None)
+            return popen([sys.executable, "-c", script], **kwargs)
+
+        with patch("cli.agent.subprocess.Popen", side_effect=fake_wevtutil):
+            started = time.monotonic()
+            events = Agent(speculative_correction=False)._query_windows_security_events(timeout=10)
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual([e["EventID"] for e in events], ["4625"])
+
+
+class TestSpeculativeCorrection(unittest.TestCase):
+    """Test cases for corrections requested while an action runs."""
+
+    def _run_step(self, failure_output):
+        """Runs a step whose first action fails with `failure_output` and whose correction succeeds."""
+        agent = Agent(auto_approve=True, speculative_correction=True)
+        client = MagicMock()
+        client.generate_correction.side_effect = lambda **kwargs: {
+            "commands": [f"correction {client.generate_correction.call_count} for '{kwargs['stderr']}'"], "explanation": ""
+        }
+        actions = []
+
+        def perform(response):
+            actions.append(response["commands"][0])
+            return (False, failure_output) if len(actions) == 1 else (True, {"success": True, "stdout": "", "stderr": ""})
+
+        with patch("cli.agent.get_client", return_value=client), \
+                patch.object(agent, "_next_action", return_value={"commands": ["false"], "explanation": ""}), \
+                patch.object(agent, "_perform_action", side_effect=perform):
+            agent.execute_step("do it")
+        agent._correction_pool.shutdown()
+        return client, actions
+
+    def test_failure_with_output_is_reprompted(self):
+        """Test that a speculative correction is replaced by one that sees the real stderr."""
+        client, actions = self._run_step({"success": False, "stdout": "", "stderr": "permission denied"})
+
+        # The speculative request (1) is dropped in favour of a request with the real stderr (2)
+        self.assertEqual(actions, ["false", "correction 2 for 'permission denied'"])
+
+    def test_failure_without_output_uses_speculative_correction(self):
+        """Test that a failure with no output reuses the correction requested in advance."""
+        client, actions = self._run_step({"success": False, "stdout": "", "stderr": ""})
+
+        self.assertEqual(actions, ["false", "correction 1 for ''"])
+
+    def test_defaults_to_config(self):
+        """Test that the option falls back to the CLI_SPECULATIVE_CORRECTION setting."""
+        with patch("cli.agent.get_config", return_value=MagicMock(speculative_correction=True)):
+            self.assertTrue(Agent().speculative_correction)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,206 @@
+import json
+import unittest
+from collections import deque
+from unittest.mock import MagicMock, patch
+
+from cli.api import SHELL_COMMAND_SIMILARITY, GeminiClient, HistoryItem, _JsonStreamScanner, _extract_json, _format_history
+
+
+class TestExtractJson(unittest.TestCase):
+    """Test cases for locating JSON in model responses."""
+
+    def test_plain_json(self):
+        """Test that a bare JSON document is returned unchanged."""
+        self.assertEqual(_extract_json('{"commands": ["ls"]}'), '{"commands": ["ls"]}')
+
+    def test_fenced_json_with_surrounding_text(self):
+        """Test that a fenced object is extracted from surrounding prose."""
+        text = 'Here you go:\n```json\n{"a": [1, {"b": 2}]}\n```\nAnything else?'
+        self.assertEqual(json.loads(_extract_json(text)), {"a": [1, {"b": 2}]})
+
+    def test_delimiters_inside_strings(self):
+        """Test that braces, fences and escaped quotes inside strings don't end the scan."""
+        payload = {"report": "Use:\n```python\nd = {'k': [1]}\n```\nthen \"quote\" and \\\\ done }"}
+        text = "```json\n" + json.dumps(payload) + "\n```"
+        self.assertEqual(json.loads(_extract_json(text)), payload)
+
+    def test_top_level_array(self):
+        """Test that a JSON array is extracted."""
+        self.assertEqual(json.loads(_extract_json('Result: [{"x": 1}, {"x": 2}] done')), [{"x": 1}, {"x": 2}])
+
+    def test_unbalanced_input(self):
+        """Test that a truncated document is returned for the parser to reject."""
+        with self.assertRaises(json.JSONDecodeError):
+            json.loads(_extract_json('{"a": [1, 2'))
+
+
+class TestJsonStreamScanner(unittest.TestCase):
+    """Test cases for finding the end of a streamed JSON response."""
+
+    def feed_all(self, text, size):
+        scanner = _JsonStreamScanner()
+        for i in range(0, len(text), size):
+            if scanner.feed(text[i:i + size]):
+                break
+        return scanner
+
+    def test_value_completes_across_chunks(self):
+        """Test that the value is found whatever the chunk boundaries, including split escapes and fences."""
+        payload = {"report": "a \"quoted\" {brace} and \\ slash", "commands": ["ls", "df -h"]}
+        text = "```json\n" + json.dumps(payload) + "\n```\nTrailing remark."
+        for size in (1, 2, 3, 7, len(text)):
+            scanner = self.feed_all(text, size)
+            self.assertIsNotNone(scanner.value, size)
+            self.assertEqual(json.loads(scanner.value), payload)
+
+    def test_leading_prose_is_not_tracked(self):
+        """Test that a response not opening with JSON is left for _extract_json."""
+        scanner = self.feed_all('Sure: {"a": 1}', 4)
+        self.assertIsNone(scanner.value)
+        self.assertEqual(json.loads(_extract_json(scanner.text)), {"a": 1})
+
+
+class TestFormatHistory(unittest.TestCase):
+    """Test cases for rendering history into prompts."""
+
+    HISTORY = [
+        {"action": "user_instruction", "instruction": "show disk usage"},
+        {"step": "Check disk", "action": "shell", "commands": ["df -h"], "result": {"success": True, "stdout": "ok", "stderr": ""}},
+        {"step": "Read log", "action": "tool:read_file", "args": {"file_path": "a.log"}, "result": {"success": False, "output": "missing"}},
+    ]
+
+    def test_conversational(self):
+        """Test that agent history renders as one line per entry."""
+        self.assertEqual(_format_history(self.HISTORY).splitlines(), [
+            "User: show disk usage",
+            "Agent: Ran command: `df -h` -> Success. Output: None",
+            "Agent: Used tool: `read_file` with args `{'file_path': 'a.log'}` -> Failed. Output: missing",
+        ])
+
+    def test_chat_messages(self):
+        """Test that role/content messages are rendered as-is."""
+        history = [{"role": "user", "content": "hi"}, {"role": "model", "content": "hello"}]
+        self.assertEqual(_format_history(history), "user: hi\nmodel: hello")
+
+    def test_detailed(self):
+        """Test that the detailed form lists action, outcome and output per step."""
+        lines = _format_history(self.HISTORY[1:], mode="detailed").splitlines()
+        self.assertEqual(lines[:4], [
+            "- Step: Check disk",
+            "  - Action: Ran shell command `df -h`",
+            "  - Outcome: Success",
+            "  - Output: STDOUT: ok",
+        ])
+        self.assertEqual(lines[-1], "  - Output: missing")
+
+    def test_history_items_match_dicts(self):
+        """Test that HistoryItem entries render the same as their dict form."""
+        items = [HistoryItem.from_dict(entry) for entry in self.HISTORY]
+        self.assertEqual(_format_history(items), _format_history(self.HISTORY))
+        self.assertEqual(_format_history(items, mode="detailed"), _format_history(self.HISTORY, mode="detailed"))
+
+
+class TestNextActionReuse(unittest.TestCase):
+    """Test cases for reusing the previous agent turn."""
+
+    def setUp(self):
+        self.client = GeminiClient.__new__(GeminiClient)
+        self.client.agent_model = None
+        self.client._last_next_action = None
+        self.replies = iter(['{"answer": "first"}', '{"answer": "second"}'])
+        self.client._construct_agent_prompt = lambda history, instruction: instruction
+        self.client._generate = MagicMock(side_effect=lambda model, prompt: MagicMock(text=next(self.replies)))
+
+    def test_identical_turn_is_reused(self):
+        """Test that the same instruction on an unchanged history is not sent again."""
+        history = [{"role": "user", "content": "continue"}]
+        first = self.client.generate_next_action(history, "continue")
+        self.assertEqual(self.client.generate_next_action(list(history), "continue"), first)
+        self.assertEqual(self.client._generate.call_count, 1)
+
+    def test_changed_history_is_sent_again(self):
+        """Test that repeating an instruction after the history changed gets a fresh answer."""
+        history = [{"role": "user", "content": "continue"}]
+        self.client.generate_next_action(history, "continue")
+        history += [{"role": "agent", "content": "first"}, {"role": "user", "content": "continue"}]
+        self.assertEqual(self.client.generate_next_action(history, "continue"), {"answer": "second"})
+        self.assertEqual(self.client._generate.call_count, 2)
+
+
+class TestShellCommandSemantics(unittest.TestCase):
+    """Test cases for semantic replay of generated shell commands."""
+
+    def setUp(self):
+        self.client = GeminiClient.__new__(GeminiClient)
+        self.client.config = MagicMock(auto_execute=False, cache_similarity_threshold=0.92)
+
+    def test_stricter_threshold(self):
+        """Test that shell commands need a closer paraphrase than the cache-wide threshold."""
+        options = self.client._shell_command_semantics("shell_command", "delete old logs")
+        self.assertEqual(options["semantic_key"], ("shell_command", "delete old logs"))
+        self.assertGreaterEqual(options["semantic_threshold"], SHELL_COMMAND_SIMILARITY)
+
+    def test_no_replay_when_auto_executing(self):
+        """Test that commands run without confirmation are never replayed from a paraphrase."""
+        self.client.config.auto_execute = True
+        self.assertEqual(self.client._shell_command_semantics("shell_command", "delete old logs"), {})
+
+
+class TestRefactorCaching(unittest.TestCase):
+    """Test cases for caching generated refactorings."""
+
+    def test_near_duplicate_instructions_are_not_replayed(self):
+        """Test that refactorings are only reused for the exact prompt, never a similar instruction."""
+        client = GeminiClient.__new__(GeminiClient)
+        client._send_request = MagicMock(return_value={})
+        client.generate_refactor("def foo(): pass", "rename foo to bar")
+        client.generate_refactor("def foo(): pass", "rename foo to baz")
+
+        prompts = [call.args[0] for call in client._send_request.call_args_list]
+        self.assertIn("rename foo to bar", prompts[0])
+        self.assertIn("rename foo to baz", prompts[1])
+        for call in client._send_request.call_args_list:
+            self.assertNotIn("semantic_key", call.kwargs)
+
+
+class TestRecentCorrections(unittest.TestCase):
+    """Test cases for reusing the response to a repeated correction instruction."""
+
+    def setUp(self):
+        self.client = GeminiClient.__new__(GeminiClient)
+        self.client._recent_instructions = deque(maxlen=16)
+        self.client.embed = MagicMock(side_effect=lambda text: [1.0, 0.0] if "py" in text else [0.0, 1.0])
+        self.client._send_request = MagicMock(side_effect=lambda prompt, bypass_cache: {"commands": [f"call {self.client._send_request.call_count}"]})
+
+    def correct(self, instruction):
+        return self.client.generate_correction([], "ls", "", "", override_instruction=instruction)
+
+    def test_first_correction_is_not_embedded(self):
+        """Test that a correction with nothing to compare against costs no embedding call."""
+        with patch("cli.api.semantic_cache", MagicMock(ttl=60)):
+            self.correct("no, list only .py files")
+        self.client.embed.assert_not_called()
+
+    def test_repeated_correction_is_reused(self):
+        """Test that a verbatim repeat is reused without embedding and a paraphrase after embedding."""
+        with patch("cli.api.semantic_cache", MagicMock(ttl=60)):
+            first = self.correct("no, list only .py files")
+            self.assertEqual(self.correct(" no, list only .py files "), first)
+            self.client.embed.assert_not_called()
+
+            self.assertEqual(self.correct("only the py files please"), first)
+            self.assertEqual(self.client.embed.call_count, 2)  # The new instruction and the stored one
+            self.assertNotEqual(self.correct("show hidden files"), first)
+        self.assertEqual(self.client._send_request.call_count, 2)
+
+    def test_disabled_semantic_cache(self):
+        """Test that nothing is remembered or embedded while the semantic cache is disabled."""
+        with patch("cli.api.semantic_cache", MagicMock(ttl=0)):
+            self.correct("no, list only .py files")
+            self.correct("no, list only .py files")
+        self.client.embed.assert_not_called()
+        self.assertEqual(self.client._send_request.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,10 @@
 import os
+import tempfile
+import tomllib
 import unittest
 from unittest.mock import patch
 
-from cli.config import Config
+from cli.config import Config, _dump_toml, _load_dotenv
 
 
 class TestConfig(unittest.TestCase):
@@ -81,5 +83,51 @@ class TestConfig(unittest.TestCase):
             self.assertFalse(config.validate())
 
 
+
+class TestLoadDotenv(unittest.TestCase):
+    """Test cases for loading `.env` files."""
+
+    def test_loads_working_directory_and_project_root(self):
+        """Test that an unrelated `.env` in the working directory doesn't hide the project root's."""
+        with tempfile.TemporaryDirectory() as cwd, tempfile.TemporaryDirectory() as root:
+            with open(os.path.join(cwd, ".env"), "w") as f:
+                f.write("GEMINI_MODEL=cwd-model\nOTHER_TOOL_TOKEN=abc\n")
+            with open(os.path.join(root, ".env"), "w") as f:
+                f.write("GEMINI_API_KEY=root-key\nGEMINI_MODEL=root-model\n")
+
+            with patch.dict(os.environ, {"CLI_VERBOSE": "true"}, clear=True), \
+                    patch("cli.config.os.getcwd", return_value=cwd), patch("cli.config._PROJECT_ROOT", root):
+                _load_dotenv()
+
+                self.assertEqual(os.environ["GEMINI_API_KEY"], "root-key")
+                self.assertEqual(os.environ["GEMINI_MODEL"], "cwd-model")  # The working directory wins
+                self.assertEqual(os.environ["OTHER_TOOL_TOKEN"], "abc")
+                self.assertEqual(os.environ["CLI_VERBOSE"], "true")
+
+
+
+class TestDumpToml(unittest.TestCase):
+    """Test cases for writing the default config file."""
+
+    def test_strings_needing_escapes_round_trip(self):
+        """Test that quotes, backslashes, control characters and non-ASCII text survive a round trip."""
+        config = {"api": {
+            "GEMINI_API_KEY": 'a "quoted" \\path\\ with\ttabs\nand lines \x01\x7f',
+            "CLI_CUSTOM_PROMPT": "café – 😀",
+            "CLI_MAX_HISTORY": 100,
+            "CLI_CACHE_SIMILARITY": 0.92,
+            "CLI_VERBOSE": False,
+        }}
+        self.assertEqual(tomllib.loads(_dump_toml(config)), config)
+
+    def test_nested_tables_round_trip(self):
+        """Test that nested tables and keys that can't be bare round-trip, with each key in its own table."""
+        config = {
+            "application": {"CLI_LOG_DIR": "/tmp/logs", "cache": {"ttl": 60, "paths": {"dir": "/tmp/c"}}, "after": 1},
+            "key with.dots": {"not bare": "x"},
+        }
+        self.assertEqual(tomllib.loads(_dump_toml(config)), config)
+
+
 if __name__ == "__main__":
     unittest.main() 
\ No newline at end of file
@@ -1,7 +1,8 @@
+import shlex
 import unittest
 from unittest.mock import patch, MagicMock
 
-from cli.executor import CommandExecutor
+from cli.executor import CommandExecutor, _split_command
 
 
 class TestCommandExecutor(unittest.TestCase):
@@ -11,14 +12,14 @@ class TestCommandExecutor(unittest.TestCase):
         """Set up test fixtures."""
         self.executor = CommandExecutor()
     
-    @patch('cli.executor.subprocess.Popen')
-    def test_execute_command_success(self, mock_popen):
+    @patch('cli.executor.subprocess.run')
+    def test_execute_command_success(self, mock_run):
         """Test successful command execution."""
         # Mock successful command execution
         process_mock = MagicMock()
         process_mock.returncode = 0
-        process_mock.communicate.return_value = ("command output", "")
-        mock_popen.return_value = process_mock
+        process_mock.stdout, process_mock.stderr = "command output", ""
+        mock_run.return_value = process_mock
         
         # Execute command
         success, stdout, stderr = self.executor.execute_command("echo 'hello'")
@@ -28,19 +29,30 @@ class TestCommandExecutor(unittest.TestCase):
         self.assertEqual(stdout, "command output")
         self.assertEqual(stderr, "")
         
-        # Check that Popen was called with correct arguments
-        mock_popen.assert_called_once()
-        args, kwargs = mock_popen.call_args
+        # Check that subprocess.run was called with correct arguments
+        mock_run.assert_called_once()
+        args, kwargs = mock_run.call_args
         self.assertEqual(args[0], ["echo", "hello"])
+
+    @patch('cli.executor.subprocess.run')
+    def test_execute_command_list(self, mock_run):
+        """Test that a pre-split command is passed through without shell parsing."""
+        mock_run.return_value = MagicMock(returncode=0, stdout="", stderr="")
+
+        self.executor.execute_command(["echo", "it's"])
+
+        args, kwargs = mock_run.call_args
+        self.assertEqual(args[0], ["echo", "it's"])
+        self.assertFalse(kwargs["shell"])
     
-    @patch('cli.executor.subprocess.Popen')
-    def test_execute_command_failure(self, mock_popen):
+    @patch('cli.executor.subprocess.run')
+    def test_execute_command_failure(self, mock_run):
         """Test failed command execution."""
         # Mock failed command execution
         process_mock = MagicMock()
         process_mock.returncode = 1
-        process_mock.communicate.return_value = ("", "command error")
-        mock_popen.return_value = process_mock
+        process_mock.stdout, process_mock.stderr = "", "command error"
+        mock_run.return_value = process_mock
         
         # Execute command
         success, stdout, stderr = self.executor.execute_command("invalid_command")
@@ -94,6 +106,41 @@ class TestCommandExecutor(unittest.TestCase):
         # Check that execute_command was called only twice (not for command3)
         self.assertEqual(mock_execute_command.call_count, 2)
 
+    def test_commands_are_parallel_safe(self):
+        """Test classification of independent commands."""
+        self.assertTrue(self.executor.commands_are_parallel_safe(["uname -a", "df -h", "ls /tmp"]))
+        self.assertFalse(self.executor.commands_are_parallel_safe(["ls"]))
+        self.assertFalse(self.executor.commands_are_parallel_safe(["cd /tmp", "ls"]))
+        self.assertFalse(self.executor.commands_are_parallel_safe(["ls > out.txt", "cat out.txt"]))
+        self.assertFalse(self.executor.commands_are_parallel_safe(["mkdir build", "ls build"]))
+
+    def test_commands_that_change_state_are_not_parallel_safe(self):
+        """Test that programs which run commands or write state are never run concurrently."""
+        self.assertFalse(self.executor.commands_are_parallel_safe(["env rm -rf /tmp/zz", "ls"]))
+        self.assertFalse(self.executor.commands_are_parallel_safe(["date -s 2020-01-01", "ls"]))
+        self.assertFalse(self.executor.commands_are_parallel_safe(["hostname foo", "ls"]))
+        self.assertFalse(self.executor.commands_are_parallel_safe(["find /tmp -name x -delete", "ls"]))
+        self.assertFalse(self.executor.commands_are_parallel_safe(["find /tmp -name x -exec rm {} +", "ls"]))
+        self.assertFalse(self.executor.commands_are_parallel_safe(["find /tmp -execdir touch {} +", "ls"]))
+        self.assertFalse(self.executor.commands_are_parallel_safe(["find /tmp -fprint out.txt", "ls"]))
+        self.assertTrue(self.executor.commands_are_parallel_safe(["find /tmp -name '*.log'", "ls"]))
+
+    def test_split_command_matches_shlex(self):
+        """Test that the fast path splits plain commands exactly as shlex does."""
+        for command in ["ls -la /tmp", " df\t-h\r\n", "echo a\vb", "echo a\fb", "echo a\u00a0b", ""]:
+            self.assertEqual(_split_command(command), tuple(shlex.split(command)))
+
+    @patch('cli.executor.CommandExecutor.execute_command')
+    def test_execute_commands_parallel(self, mock_execute_command):
+        """Test that parallel execution keeps input order and runs past failures."""
+        mock_execute_command.side_effect = lambda command: (command != "command1", command, "")
+
+        results = self.executor.execute_commands_parallel(["command1", "command2", "command3"])
+
+        self.assertEqual([r["command"] for r in results], ["command1", "command2", "command3"])
+        self.assertEqual([r["success"] for r in results], [False, True, True])
+        self.assertEqual(mock_execute_command.call_count, 3)
+
 
 if __name__ == "__main__":
     unittest.main() 
\ No newline at end of file
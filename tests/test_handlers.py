@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+from cli.handlers import _apply_refactoring
+from cli.parser import get_symbol_code
+
+
+class TestApplyRefactoring(unittest.TestCase):
+    """Test cases for splicing refactored code into a file."""
+
+    def setUp(self):
+        """Set up a temporary source file."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "module.py")
+
+    def tearDown(self):
+        """Clean up the temporary directory."""
+        self.tmp_dir.cleanup()
+
+    def _refactor(self, source: bytes, symbol, refactored_code: str) -> str:
+        """Writes `source`, replaces `symbol` the way the refactor command does and returns the new text."""
+        with open(self.path, "wb") as f:
+            f.write(source)
+        _, content, start_line, end_line = get_symbol_code(self.path, symbol)
+        self.assertTrue(_apply_refactoring(self.path, content, refactored_code, start_line, end_line))
+        with open(self.path, encoding="utf-8") as f:
+            return f.read()
+
+    def test_multibyte_source_between_adjacent_symbols(self):
+        """Test that multi-byte characters before and after the symbol don't shift the splice."""
+        source = (
+            '# Ünïcödé 😀\n'
+            'def first():\n    return "é"\n'
+            'def second():\n    return "😀😀"\n'
+            'def third():\n    return "ß"\n'
+        ).encode("utf-8")
+
+        result = self._refactor(source, "second", 'def second():\n    return "✓"')
+
+        self.assertEqual(result, (
+            '# Ünïcödé 😀\n'
+            'def first():\n    return "é"\n'
+            'def second():\n    return "✓"\n'
+            'def third():\n    return "ß"\n'
+        ))
+
+    def test_crlf_source(self):
+        """Test that a CRLF file is spliced on the right lines, leaving its neighbours intact."""
+        source = b'def first():\r\n    return 1\r\ndef second():\r\n    return 2\r\ndef third():\r\n    return 3\r\n'
+
+        result = self._refactor(source, "second", "def second():\n    return 22")
+
+        self.assertEqual(result, 'def first():\n    return 1\ndef second():\n    return 22\ndef third():\n    return 3\n')
+
+    def test_whole_file_and_last_symbol_without_trailing_newline(self):
+        """Test replacing the whole file, and a final symbol on a line with no newline."""
+        self.assertEqual(self._refactor(b"a = 1\nb = 2\n", None, "c = 3"), "c = 3\n")
+        self.assertEqual(
+            self._refactor(b"def first():\n    pass\ndef last():\n    pass", "last", "def last():\n    return 0"),
+            "def first():\n    pass\ndef last():\n    return 0\n",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import json
+import unittest
+from pathlib import PurePosixPath
+
+from cli import jsonutil
+
+
+class TestJsonUtil(unittest.TestCase):
+    """Test cases for the JSON helpers."""
+
+    def test_dumps_round_trip(self):
+        """Test that serialized data parses back, with non-JSON values stringified."""
+        data = {"b": [1, 2.5, None, True], "a": "text"}
+        self.assertEqual(jsonutil.loads(jsonutil.dumps(data, sort_keys=True)), data)
+        self.assertEqual(jsonutil.loads(jsonutil.dumps({"path": PurePosixPath("/tmp")})), {"path": "/tmp"})
+
+    def test_small_input_is_kept_whole(self):
+        """Test that input under the budget is serialized unchanged."""
+        data = {"packages": ["a", "b"], "release": "6.1"}
+        self.assertEqual(json.loads(jsonutil.dumps_within_budget(data, budget=1000)), data)
+
+    def test_large_input_is_summarized_within_budget(self):
+        """Test that large lists and strings are shortened to fit the budget."""
+        data = {"packages": [f"package-{i}" for i in range(100000)], "log": "x" * 500000}
+
+        raw = jsonutil.dumps_within_budget(data, budget=30000)
+
+        self.assertLessEqual(len(raw), 30000)
+        summary = json.loads(raw)
+        self.assertEqual(summary["packages"][0], "package-0")
+        self.assertIn("more items omitted", summary["packages"][-1])
+        self.assertIn("characters omitted", summary["log"])
+
+    def test_string_array_stream(self):
+        """Test that array items are reported once complete, whatever the chunk boundaries."""
+        text = '```json\n{"commands": ["ls -la", "echo \\"a, b\\"", "df"], "explanation": "done"}'
+        for size in (1, 4, len(text)):
+            stream = jsonutil.StringArrayStream("commands")
+            items = []
+            for i in range(0, len(text), size):
+                items.extend(stream.feed(text[i:i + size]))
+            self.assertEqual(items, ["ls -la", 'echo "a, b"', "df"])
+            self.assertTrue(stream.done)
+
+    def test_string_array_stream_skips_key_used_as_value(self):
+        """Test that the field name appearing as a value, or split across chunks, doesn't confuse the stream."""
+        text = '{"note": "commands", "commands"\n  : ["a", "b\\u0041"]}'
+        for size in range(1, len(text) + 1):
+            stream = jsonutil.StringArrayStream("commands")
+            items = []
+            for i in range(0, len(text), size):
+                items.extend(stream.feed(text[i:i + size]))
+            self.assertEqual(items, ["a", "bA"], size)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from cli.llm_cache import LLMCache, SemanticCache
+
+
+class TestLLMCache(unittest.TestCase):
+    """Test cases for the LLMCache class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = LLMCache(cache_dir=os.path.join(self.tmp_dir.name, "cache"), ttl=60)
+
+    def tearDown(self):
+        """Clean up the temporary cache directory."""
+        self.tmp_dir.cleanup()
+
+    def test_cache_key_is_deterministic(self):
+        """Test that equal inputs produce equal keys regardless of dict ordering."""
+        key1 = LLMCache.cache_key("model", [{"a": 1, "b": 2}], "list files")
+        key2 = LLMCache.cache_key("model", [{"b": 2, "a": 1}], "list files")
+        self.assertEqual(key1, key2)
+        self.assertNotEqual(key1, LLMCache.cache_key("other-model", [{"a": 1, "b": 2}], "list files"))
+
+    def test_prompt_key_includes_model(self):
+        """Test that prompt keys change with the model so a model switch invalidates them."""
+        self.assertEqual(LLMCache.prompt_key("model", "explain"), LLMCache.prompt_key("model", "explain"))
+        self.assertNotEqual(LLMCache.prompt_key("model", "explain"), LLMCache.prompt_key("other-model", "explain"))
+
+    def test_set_and_get(self):
+        """Test that a stored response is returned, also from a fresh instance."""
+        key = LLMCache.cache_key("model", [], "list files")
+        self.assertIsNone(self.cache.get(key))
+
+        self.cache.set(key, {"commands": ["ls"]})
+        self.assertEqual(self.cache.get(key), {"commands": ["ls"]})
+
+        # A new instance reads the entry back from disk
+        fresh = LLMCache(cache_dir=self.cache.cache_dir, ttl=60)
+        self.assertEqual(fresh.get(key), {"commands": ["ls"]})
+
+    def test_expired_entry(self):
+        """Test that entries older than the TTL are treated as misses."""
+        key = LLMCache.cache_key("model", [], "list files")
+        self.cache.set(key, {"commands": ["ls"]})
+
+        with patch("cli.llm_cache.time.time", return_value=time.time() + 120):
+            self.assertIsNone(self.cache.get(key))
+        self.assertFalse(os.path.exists(self.cache._path(key)))
+
+    def test_malformed_entry_is_discarded(self):
+        """Test that JSON files that aren't cache entries are misses and are removed."""
+        os.makedirs(self.cache.cache_dir)
+        for i, content in enumerate(('{"response": {}}', '[1, 2]', 'null', '{"created": "yesterday", "response": {}}')):
+            key = LLMCache.prompt_key("model", f"prompt {i}")
+            with open(self.cache._path(key), "w") as f:
+                f.write(content)
+
+            self.assertIsNone(self.cache.get(key))
+            self.assertFalse(os.path.exists(self.cache._path(key)))
+
+    def test_disabled_cache(self):
+        """Test that a non-positive TTL disables the cache."""
+        cache = LLMCache(cache_dir=self.cache.cache_dir, ttl=0)
+        key = LLMCache.cache_key("model", [], "list files")
+        cache.set(key, {"commands": ["ls"]})
+        self.assertIsNone(cache.get(key))
+
+
+class TestSemanticCache(unittest.TestCase):
+    """Test cases for the SemanticCache class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = SemanticCache(index_file=os.path.join(self.tmp_dir.name, "index.json"), threshold=0.9)
+        self.signature = SemanticCache.signature([])
+
+    def tearDown(self):
+        """Clean up the temporary cache directory."""
+        self.tmp_dir.cleanup()
+
+    def test_similar_embedding_hits(self):
+        """Test that a close embedding in the same context returns the stored response."""
+        self.cache.set(self.signature, [1.0, 0.0, 0.0], {"commands": ["ps aux"]})
+
+        self.assertTrue(self.cache.has_entries(self.signature))
+        self.assertEqual(self.cache.get(self.signature, [0.98, 0.1, 0.0]), {"commands": ["ps aux"]})
+        self.assertIsNone(self.cache.get(self.signature, [0.0, 1.0, 0.0]))
+
+    def test_threshold_override(self):
+        """Test that a stricter per-call threshold rejects a match the cache-wide threshold accepts."""
+        self.cache.set(self.signature, [1.0, 0.0, 0.0], {"commands": ["rm old.log"]})
+        paraphrase = [0.93, 0.37, 0.0]  # Cosine similarity of about 0.93
+
+        self.assertIsNotNone(self.cache.get(self.signature, paraphrase))
+        self.assertIsNone(self.cache.get(self.signature, paraphrase, threshold=0.95))
+
+    def test_other_context_misses(self):
+        """Test that entries recorded under another history are never returned."""
+        self.cache.set(self.signature, [1.0, 0.0, 0.0], {"commands": ["ps aux"]})
+        other = SemanticCache.signature([{"action": "shell", "commands": ["cd /tmp"]}])
+
+        self.assertFalse(self.cache.has_entries(other))
+        self.assertIsNone(self.cache.get(other, [1.0, 0.0, 0.0]))
+
+    def test_eviction(self):
+        """Test that the oldest entries are dropped beyond max_entries."""
+        cache = SemanticCache(index_file=self.cache.index_file, threshold=0.9, max_entries=2)
+        for i in range(3):
+            cache.set(self.signature, [float(i + 1), 1.0], {"n": i})
+        self.assertEqual([e["response"]["n"] for e in cache._load()], [1, 2])
+
+    def test_entries_persist_across_instances(self):
+        """Test that appended entries are read back by a fresh instance."""
+        self.cache.set(self.signature, [1.0, 0.0], {"n": 1})
+        self.cache.set(self.signature, [0.0, 1.0], {"n": 2})
+
+        fresh = SemanticCache(index_file=self.cache.index_file, threshold=0.9)
+        self.assertEqual(fresh.get(self.signature, [0.0, 1.0]), {"n": 2})
+
+    def test_expired_entries_miss(self):
+        """Test that entries older than the TTL are ignored."""
+        cache = SemanticCache(index_file=self.cache.index_file, threshold=0.9, ttl=60)
+        cache.set(self.signature, [1.0, 0.0], {"n": 1})
+
+        with patch("cli.llm_cache.time.time", return_value=time.time() + 120):
+            self.assertFalse(cache.has_entries(self.signature))
+            self.assertIsNone(cache.get(self.signature, [1.0, 0.0]))
+
+    def test_compaction_and_torn_lines(self):
+        """Test that a torn line is skipped and the index is compacted once it doubles."""
+        cache = SemanticCache(index_file=self.cache.index_file, threshold=0.9, max_entries=2)
+        cache.set(self.signature, [1.0, 0.0], {"n": 0})
+        with open(cache.index_file, "ab") as f:
+            f.write(b'{"signature": "trunc')
+        cache.set(self.signature, [1.0, 1.0], {"n": 1})
+
+        fresh = SemanticCache(index_file=cache.index_file, threshold=0.9, max_entries=2)
+        self.assertEqual([e["response"]["n"] for e in fresh._load()], [0, 1])
+
+        for i in range(2, 5):
+            fresh.set(self.signature, [1.0, float(i)], {"n": i})
+        with open(cache.index_file, "rb") as f:
+            self.assertLessEqual(len([line for line in f if line.strip()]), 4)
+        self.assertEqual([e["response"]["n"] for e in SemanticCache(cache.index_file, max_entries=2)._load()], [3, 4])
+
+
+if __name__ == "__main__":
+    unittest.main()
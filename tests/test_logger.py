@@ -0,0 +1,44 @@
+import os
+import tempfile
+import unittest
+
+from cli.logger import _tail_lines
+
+
+class TestTailLines(unittest.TestCase):
+    """Test cases for reading the last lines of a log file."""
+
+    def setUp(self):
+        """Set up a temporary log file."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "commands.jsonl")
+
+    def tearDown(self):
+        """Clean up the temporary directory."""
+        self.tmp_dir.cleanup()
+
+    def _write(self, data: bytes):
+        with open(self.path, "wb") as f:
+            f.write(data)
+
+    def test_newline_on_block_boundary(self):
+        """Test that a block starting exactly at a newline still yields the requested number of lines."""
+        data = b"xx\nbbb\nccc\n"
+        block_size = 9
+        self._write(data)
+        self.assertEqual(data[len(data) - block_size:len(data) - block_size + 1], b"\n")
+
+        self.assertEqual(_tail_lines(self.path, 2, block_size=block_size), [b"bbb", b"ccc"])
+
+    def test_line_cut_by_block_boundary(self):
+        """Test that a line cut at a block boundary is left out, and lines are read across blocks."""
+        self._write(b"first line\nsecond\r\nthird\n\nfourth")
+
+        self.assertEqual(_tail_lines(self.path, 2, block_size=8), [b"third", b"fourth"])
+        self.assertEqual(_tail_lines(self.path, 3, block_size=4), [b"second", b"third", b"fourth"])
+        self.assertEqual(_tail_lines(self.path, 10, block_size=4), [b"first line", b"second", b"third", b"fourth"])
+        self.assertEqual(_tail_lines(self.path, None), [b"first line", b"second", b"third", b"fourth"])
+
+
+if __name__ == "__main__":
+    unittest.main()